@@ -0,0 +1,36 @@
+"""Per frame cost of dragging every marker, against point count."""
+from PyQt5 import QtCore
+
+from common import application, dense_model, timeit
+
+from flt.flt import LabelerScene
+
+
+def drag_markers(model, step):
+    """Move every marker by step, as a multi selection drag does."""
+    for group in model.groups:
+        for item in group.m_items:
+            item.setPos(item.pos() + step)
+
+
+def main():
+    _ = application()
+    step = QtCore.QPointF(0.5, 0.5)
+    for num_points in (70, 250, 500, 1000, 2000):
+        scene = LabelerScene(None)
+        scene.model.load_model(dense_model(num_points))
+        model = scene.model
+        t_eager = timeit(lambda: drag_markers(model, step))
+
+        def deferred():
+            with model.deferred():
+                drag_markers(model, step)
+        t_deferred = timeit(deferred)
+        t_group = timeit(lambda: model.groups[0].moveBy(0.5, 0.5))
+        print(f"{num_points:5d} points: eager {t_eager:8.2f} ms/frame, "
+              f"deferred {t_deferred:8.2f} ms/frame, "
+              f"group drag {t_group:6.3f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
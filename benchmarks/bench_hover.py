@@ -0,0 +1,41 @@
+"""Hover latency on dense models: hit testing and nearest marker picking."""
+import numpy as np
+from PyQt5 import QtCore
+
+from common import application, dense_model, timeit
+
+from flt.flt import LabelerScene, stroke
+
+
+def main():
+    _ = application()
+    rng = np.random.default_rng(0)
+    for num_points in (70, 500, 1000, 2000):
+        scene = LabelerScene(None)
+        scene.model.load_model(dense_model(num_points))
+        lo, hi = scene.model.positions.min(0), scene.model.positions.max(0)
+        points = [QtCore.QPointF(x, y)
+                  for x, y in rng.uniform(lo, hi, size=(200, 2))]
+
+        def hit_test():
+            for p in points:
+                scene.items(p)
+
+        def hover():
+            for p in points:
+                scene.set_hover(scene.hover_item(p))
+
+        def nearest():
+            for p in points:
+                scene.model.marker_at(p)
+        path = scene.model.groups[0].path()
+        t_stroke = timeit(lambda: stroke(path), repeat=200)
+        n = len(points)
+        print(f"{num_points:5d} points: hit test {timeit(hit_test) / n:7.4f} "
+              f"ms, hover {timeit(hover) / n:7.4f} ms, "
+              f"nearest {timeit(nearest) / n:7.4f} ms per event, "
+              f"uncached group stroke {t_stroke:7.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Paint time and item count of a zoomed out dense model, with and
+without level of detail."""
+from common import application, dense_model, timeit
+
+from flt.flt import LabelerScene, LabelerView
+
+
+def main():
+    app = application()
+    for num_points in (70, 1000, 5000):
+        for lod_scale in (0.0, LabelerView.lod_scale):
+            LabelerView.lod_scale = lod_scale
+            scene = LabelerScene(None)
+            scene.model.load_model(dense_model(num_points))
+            view = LabelerView()
+            view.setScene(scene)
+            view.resize(800, 800)
+            view.fitInView()
+            for _ in range(8):
+                view.zoomOut()
+            app.processEvents()
+            t_paint = timeit(lambda: view.viewport().grab(), repeat=10)
+            lod = "on " if lod_scale else "off"
+            print(f"{num_points:5d} points, lod {lod}: "
+                  f"{len(scene.items()):5d} items, paint {t_paint:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Replay a drag and zoom session through the view, timing the hot paths.
+
+A session is a json list of steps, in scene coordinates:
+
+    ["press", x, y]      left button down
+    ["move", x, y]       mouse move, dragging if the button is down
+    ["release", x, y]    left button up
+    ["zoom", factor]     zoom the view
+
+Without a session file a synthetic one is replayed. Each step is followed
+by a repaint of the view, as the event loop would do, eg:
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_replay.py \\
+        --points 1000 --trace replay.json
+"""
+import argparse
+import json
+import time
+
+from PyQt5 import QtCore, QtGui
+
+from common import application, dense_model
+
+from flt.flt import LabelerView, LabelerScene
+from flt.timing import PROFILER
+
+MOUSE_EVENTS = dict(press=QtCore.QEvent.MouseButtonPress,
+                    move=QtCore.QEvent.MouseMove,
+                    release=QtCore.QEvent.MouseButtonRelease)
+
+
+def synthetic_session(model, drags=4, steps=30):
+    """Return a session hovering and dragging markers, then zooming."""
+    session = []
+    for i in range(drags):
+        x, y = model.positions[(i * 17) % len(model.positions)]
+        session += [["move", x + 20, y + 20], ["move", x, y],
+                    ["press", x, y]]
+        session += [["move", x + j, y + j / 2] for j in range(1, steps)]
+        session.append(["release", x + steps, y + steps / 2])
+    session += [["zoom", 1.25]] * 8 + [["zoom", 0.8]] * 12
+    return session
+
+
+def replay(view, session):
+    """Send the session to the view, return the seconds per step kind."""
+    viewport = view.viewport()
+    buttons = QtCore.Qt.NoButton
+    elapsed = {}
+    for kind, *args in session:
+        start = time.perf_counter()
+        if kind == "zoom":
+            view.zoom(args[0])
+        else:
+            pos = view.mapFromScene(QtCore.QPointF(*args))
+            button = QtCore.Qt.LeftButton
+            if kind == "move":
+                button = QtCore.Qt.NoButton
+            buttons = dict(press=QtCore.Qt.LeftButton,
+                           release=QtCore.Qt.NoButton).get(kind, buttons)
+            event = QtGui.QMouseEvent(
+                MOUSE_EVENTS[kind], QtCore.QPointF(pos),
+                QtCore.QPointF(viewport.mapToGlobal(pos)), button, buttons,
+                QtCore.Qt.NoModifier)
+            application().sendEvent(viewport, event)
+        viewport.repaint()
+        elapsed.setdefault(kind, []).append(time.perf_counter() - start)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("session", nargs="?", help="session json to replay")
+    parser.add_argument("--points", type=int, default=70,
+                        help="points in the model")
+    parser.add_argument("--profile", help="write the json summary here")
+    parser.add_argument("--trace", help="write the Chrome trace here")
+    args = parser.parse_args()
+
+    app = application()
+    scene = LabelerScene(None)
+    scene.model.load_model(dense_model(args.points))
+    view = LabelerView()
+    view.setScene(scene)
+    view.resize(800, 800)
+    view.show()
+    app.processEvents()
+    if args.session:
+        with open(args.session) as fid:
+            session = json.load(fid)
+    else:
+        session = synthetic_session(scene.model)
+
+    PROFILER.reset()
+    PROFILER.enabled = True
+    elapsed = replay(view, session)
+    PROFILER.enabled = False
+
+    print(f"{args.points} points, {len(session)} steps")
+    for kind, times in elapsed.items():
+        print(f"  {kind:8s} {len(times):5d} steps "
+              f"{1000 * sum(times) / len(times):8.3f} ms/step")
+    for name, stats in sorted(PROFILER.to_dict()["timers"].items()):
+        print(f"  {name:12s} {stats['calls']:6d} calls "
+              f"{stats['mean_ms']:8.3f} ms mean {stats['max_ms']:8.3f} ms max")
+    for name, n in sorted(PROFILER.to_dict()["counters"].items()):
+        print(f"  {name:12s} {n:6d}")
+    if args.profile:
+        PROFILER.save(args.profile)
+    if args.trace:
+        PROFILER.save(args.trace, trace=True)
+
+
+if __name__ == "__main__":
+    main()
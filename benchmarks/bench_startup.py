@@ -0,0 +1,39 @@
+"""Start up time of the flt command and its modules, in fresh processes."""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CASES = [
+    ("python", "pass"),
+    ("import flt.store", "import flt.store"),
+    ("import flt.dataset", "import flt.dataset"),
+    ("flt batch --help", "import sys; sys.argv = ['flt', 'batch', '--help'];"
+     "from flt.cli import main; main()"),
+    ("import flt.flt", "import flt.flt"),
+    ("window shown", "from PyQt5 import QtWidgets; from flt.flt import *;"
+     "app = QtWidgets.QApplication(['flt']); w = ImageLabelerWindow();"
+     "app.processEvents()"),
+]
+
+
+def run(code, repeat=5):
+    """Return the median wall time in ms of running code in python."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def main():
+    for name, code in CASES:
+        print(f"{name:20s} {run(code):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Compare in place model transforms against rebuilding the scene."""
+from common import application, dense_model, timeit
+
+from flt.flt import LabelerScene
+
+
+def rebuild(scene, factor):
+    """The old scale path: rebuild every group and marker."""
+    model_dict = scene.model.to_dict()
+    model_dict["pos"] = factor * scene.model.positions
+    scene.model.load_model(model_dict)
+
+
+def main():
+    _ = application()
+    for num_points in (70, 1000):
+        scene = LabelerScene(None)
+        scene.model.load_model(dense_model(num_points))
+        t_rebuild = timeit(lambda: rebuild(scene, 1.0))
+        t_scale = timeit(lambda: scene.model.scale_model(1.0, centre=None))
+        t_rotate = timeit(lambda: scene.model.rotate_model(1.0))
+        print(f"{num_points:5d} points: rebuild {t_rebuild:8.2f} ms, "
+              f"scale {t_scale:8.2f} ms, rotate {t_rotate:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Shared helpers for the benchmarks.
+
+With the package installed (`pip install -e .`), run any benchmark from the
+project directory, eg:
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_transform.py
+"""
+import math
+import time
+
+from flt.model import model
+
+
+def dense_model(num_points, group_size=20):
+    """Return a model dict of num_points on concentric rings.
+
+    With num_points equal to the default model size, return the default."""
+    if num_points == len(model["pos"]):
+        return model
+    pos, index, keys = [], {}, []
+    for start in range(0, num_points, group_size):
+        stop = min(start + group_size, num_points)
+        key = f"group_{len(keys)}"
+        radius = 50 + 10 * len(keys)
+        for i in range(start, stop):
+            t = 2 * math.pi * (i - start) / (stop - start)
+            pos.append([400 + radius * math.cos(t),
+                        400 + radius * math.sin(t)])
+        index[key] = list(range(start, stop))
+        keys.append(key)
+    return dict(pos=pos, index=index, keys=keys)
+
+
+def timeit(func, repeat=20):
+    """Return the best time in ms of repeat calls to func."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def application():
+    """Return the Qt application, creating it if needed."""
+    from PyQt5 import QtWidgets
+    return (QtWidgets.QApplication.instance() or
+            QtWidgets.QApplication(["flt-bench"]))
@@ -0,0 +1,155 @@
+"""A crash safe, append only annotation log and an index over it.
+
+Each save is one json line, ``{"image": ..., "pos": [[x, y], ...], ...}``.
+Lines are buffered and synced to disk in batches; a line torn by a crash
+is cut off when the log is next opened for writing, and lines that do not
+parse are never indexed. Query the latest landmarks with:
+
+    flt log annotations.jsonl [IMAGE ...]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from .model import read_json, write_json_atomic
+
+
+class AnnotationLog:
+    """Append landmark records to a log file.
+
+    Records are flushed and fsync'd every sync_every records, or when a
+    record arrives sync_interval seconds after the last sync."""
+
+    def __init__(self, fname, sync_every=16, sync_interval=5.0):
+        self.fname = fname
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        if os.path.exists(fname):
+            _truncate_torn(fname)
+        self._fid = open(fname, "ab")
+
+    def write(self, image, pos, **extra):
+        """Append the positions of an image, with any extra fields."""
+        record = dict(image=image,
+                      pos=np.round(np.asarray(pos, dtype=float), 2).tolist(),
+                      time=round(time.time(), 3), **extra)
+        self._fid.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._unsynced += 1
+        if (self._unsynced >= self.sync_every or
+                time.monotonic() - self._last_sync > self.sync_interval):
+            self.sync()
+
+    def sync(self):
+        """Flush buffered records and fsync them to disk."""
+        self._fid.flush()
+        os.fsync(self._fid.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """Sync and close the log."""
+        if not self._fid.closed:
+            self.sync()
+            self._fid.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LogIndex:
+    """Find the latest record of each image in a log.
+
+    The byte offset of the latest line per image is kept in a sidecar
+    ``<log>.idx`` file, so reopening only scans lines appended since. An
+    index that cannot be read, or is ahead of the log, is rebuilt."""
+
+    def __init__(self, fname, index_fname=None):
+        self.fname = fname
+        self.index_fname = index_fname or f"{fname}.idx"
+        self.size = 0
+        self.offsets = {}
+        try:
+            saved = read_json(self.index_fname)
+            if saved["size"] <= os.path.getsize(fname):
+                self.size = int(saved["size"])
+                self.offsets = dict(saved["offsets"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.size, self.offsets = 0, {}
+        self.refresh()
+
+    def refresh(self):
+        """Index lines appended since the last scan."""
+        start = self.size
+        with open(self.fname, "rb") as fid:
+            fid.seek(start)
+            for line in fid:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    self.offsets[json.loads(line)["image"]] = self.size
+                except (ValueError, KeyError, TypeError):
+                    pass
+                self.size += len(line)
+        if self.size != start:
+            write_json_atomic(dict(size=self.size, offsets=self.offsets),
+                              self.index_fname)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, image):
+        return image in self.offsets
+
+    def images(self):
+        """Return the image names in the log."""
+        return list(self.offsets)
+
+    def latest(self, image):
+        """Return the latest record saved for an image."""
+        with open(self.fname, "rb") as fid:
+            fid.seek(self.offsets[image])
+            return json.loads(fid.readline())
+
+
+def _truncate_torn(fname, block=4096):
+    """Cut a line torn by a crash from the end of a log."""
+    with open(fname, "r+b") as fid:
+        end = fid.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - block)
+            fid.seek(start)
+            newline = fid.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != fid.seek(0, os.SEEK_END):
+            fid.truncate(end)
+
+
+def main(argv=None):
+    """Print the latest landmarks per image, in print_pos format."""
+    parser = argparse.ArgumentParser(
+        prog="flt log", description="Query an annotation log.")
+    parser.add_argument("log", help="annotation log file")
+    parser.add_argument("images", nargs="*",
+                        help="image names, default is every image")
+    args = parser.parse_args(argv)
+    index = LogIndex(args.log)
+    missing = 0
+    for image in args.images or index.images():
+        if image not in index:
+            missing += 1
+            continue
+        pos = ", ".join(
+            [f"[{x:0.2f}, {y:0.2f}]" for x, y in index.latest(image)["pos"]])
+        print(f'"{image:}" : [{pos}]')
+    return 1 if missing else 0
@@ -0,0 +1,126 @@
+"""Headless batch processing of landmark models over image directories.
+
+Runs without a display or QApplication, reading only the image headers:
+
+    flt batch seed IMAGE_DIR -o OUT_DIR
+    flt batch rescale IMAGE_DIR -l LANDMARK_DIR --reference 800 800 -o OUT_DIR
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .imageinfo import image_size, list_images
+from .model import model, read_json, write_json_atomic
+from .store import LandmarkStore
+
+
+def landmark_name(fname, out_dir):
+    """Return the landmark file name for an image, as save_mdl does."""
+    stem, _ = os.path.splitext(os.path.basename(fname))
+    return os.path.join(out_dir, f"{stem}.json")
+
+
+def collisions(fnames, out_dir):
+    """Return messages for images that would share a landmark file."""
+    names = {}
+    for fname in fnames:
+        names.setdefault(landmark_name(fname, out_dir), []).append(fname)
+    return [f"{name}: written for each of {', '.join(images)}"
+            for name, images in names.items() if len(images) > 1]
+
+
+def seed(fname, model_dict, reference, out_dir):
+    """Fit the model to the image, scaling from the reference size."""
+    width, height = image_size(fname)
+    store = LandmarkStore.from_dict(model_dict)
+    factor = min(width / reference[0], height / reference[1])
+    store.affine([[factor, 0, (width - factor * reference[0]) / 2],
+                  [0, factor, (height - factor * reference[1]) / 2]])
+    write_json_atomic(store.to_dict(), landmark_name(fname, out_dir))
+
+
+def rescale(fname, lm_dir, reference, out_dir):
+    """Rescale saved landmarks from the reference size to the image size."""
+    width, height = image_size(fname)
+    store = LandmarkStore.from_dict(read_json(landmark_name(fname, lm_dir)))
+    store.affine([[width / reference[0], 0, 0],
+                  [0, height / reference[1], 0]])
+    write_json_atomic(store.to_dict(), landmark_name(fname, out_dir))
+
+
+def _run_one(job):
+    """Process pool entry point, return an error message or None."""
+    func, fname, args = job
+    try:
+        func(fname, *args)
+    except (OSError, ValueError, KeyError) as err:
+        return f"{fname}: {err}"
+    return None
+
+
+def run(func, fnames, args, jobs=None):
+    """Apply func to every image across a process pool.
+
+    Return the list of error messages."""
+    work = [(func, fname, args) for fname in fnames]
+    chunksize = max(1, len(work) // (4 * (jobs or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(_run_one, work, chunksize=chunksize)
+        return [err for err in results if err]
+
+
+def parse_args(argv):
+    """Parse the batch command line."""
+    parser = argparse.ArgumentParser(
+        prog="flt batch", description="Apply landmark models to images.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    seed_p = sub.add_parser("seed", help="seed images with a model")
+    seed_p.add_argument("-m", "--model",
+                        help="model json, default is the built in model")
+
+    rescale_p = sub.add_parser(
+        "rescale", help="rescale saved landmarks to the image size")
+    rescale_p.add_argument("-l", "--landmarks", required=True,
+                           help="directory of saved landmark json files")
+
+    for p in (seed_p, rescale_p):
+        p.add_argument("images", help="directory of images")
+        p.add_argument("-o", "--out", required=True, help="output directory")
+        p.add_argument("--reference", nargs=2, type=float,
+                       default=(800, 800), metavar=("WIDTH", "HEIGHT"),
+                       help="size the landmarks were placed in")
+        p.add_argument("-j", "--jobs", type=int, help="worker processes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the batch command."""
+    args = parse_args(argv)
+    if args.command == "seed":
+        model_dict = read_json(args.model) if args.model else model
+        func, func_args = seed, (model_dict, args.reference, args.out)
+    else:
+        func, func_args = rescale, (args.landmarks, args.reference, args.out)
+    fnames = list_images(args.images)
+    clashes = collisions(fnames, args.out)
+    if clashes:
+        for clash in clashes:
+            print(clash, file=sys.stderr)
+        print("images with the same name would overwrite each other's "
+              "landmarks, nothing written", file=sys.stderr)
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+
+    t0 = time.perf_counter()
+    errors = run(func, fnames, func_args, args.jobs)
+    elapsed = time.perf_counter() - t0
+
+    for err in errors:
+        print(err, file=sys.stderr)
+    done = len(fnames) - len(errors)
+    print(f"{done} of {len(fnames)} images in {elapsed:0.2f} s "
+          f"({done / max(elapsed, 1e-9):0.1f} images/s)", file=sys.stderr)
+    return 1 if errors else 0
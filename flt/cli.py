@@ -0,0 +1,24 @@
+"""The flt command, starting the application or a headless subcommand.
+
+Only the application imports Qt, so subcommands start quickly and run
+without a display.
+"""
+import importlib
+import sys
+
+SUBCOMMANDS = dict(batch="batch", convert="convert", dataset="dataset",
+                   log="annolog", stats="shapestats", validate="validate")
+
+
+def main():
+    """Run a subcommand, else the application."""
+    if sys.argv[1:2] and sys.argv[1] in SUBCOMMANDS:
+        command = importlib.import_module(f".{SUBCOMMANDS[sys.argv[1]]}",
+                                          __package__)
+        sys.exit(command.main(sys.argv[2:]))
+    from .flt import main as app_main
+    app_main()
+
+
+if __name__ == '__main__':
+    main()
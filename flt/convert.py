@@ -0,0 +1,375 @@
+"""Convert landmarks to and from iBUG .pts, CSV and COCO keypoint files.
+
+Imports write one saved model json per image, as Save Model... does, and
+exports read them. Files are streamed and converted across a process
+pool; COCO files are read a block at a time, never loaded whole:
+
+    flt convert import pts landmarks/ 300w/*.pts
+    flt convert import csv landmarks/ points.csv
+    flt convert import coco landmarks/ person_keypoints.json
+    flt convert export pts pts/ landmarks/*.json
+    flt convert export csv points.csv landmarks/*.json
+    flt convert export coco keypoints.json landmarks/*.json --images imgs/
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .imageinfo import IMAGE_EXTENSIONS, image_size
+from .model import model, read_json, write_json
+from .store import (drawn_indices, index_size, saved_index,
+                    saved_positions)
+
+CHUNK = 1000
+BLOCK = 1 << 20
+
+
+def to_model(points, template=model):
+    """Return a saved model dict of points, in the template's index and
+    keys.
+
+    points hold the drawn points in keys order, as models are saved and
+    68 point iBUG files list them, or every point of the index."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    index, keys = template["index"], template["keys"]
+    drawn = len(drawn_indices(index, keys))
+    if len(points) not in (drawn, index_size(index)):
+        raise ValueError(f"{len(points)} points do not fit a "
+                         f"{drawn} point model.")
+    if np.isnan(points).any():
+        raise ValueError("some points are not labelled.")
+    pos = saved_positions(points, index, keys)
+    return dict(pos=pos.tolist(), index=index, keys=keys)
+
+
+def read_points(fname, num_points=None):
+    """Return the saved points of a model json, the first num_points if
+    given, and the model dict."""
+    model_dict = read_json(fname)
+    pos = np.asarray(model_dict["pos"], dtype=float).reshape(-1, 2)
+    if "index" in model_dict:
+        pos = saved_positions(pos, model_dict["index"], model_dict["keys"])
+    return pos[:num_points], model_dict
+
+
+def stem(fname):
+    """Return a file name without directory or extension."""
+    return os.path.splitext(os.path.basename(fname))[0]
+
+
+def read_pts(fname):
+    """Return the (N, 2) points of an iBUG .pts file."""
+    with open(fname) as fid:
+        text = fid.read()
+    body = text[text.index("{") + 1:text.index("}")]
+    return np.array(body.split(), dtype=float).reshape(-1, 2)
+
+
+def write_pts(points, fname):
+    """Write (N, 2) points as an iBUG .pts file."""
+    lines = [f"{x:0.3f} {y:0.3f}" for x, y in points]
+    with open(fname, "w") as fid:
+        fid.write(f"version: 1\nn_points:  {len(lines)}\n{{\n")
+        fid.write("\n".join(lines) + "\n}\n")
+
+
+def import_pts(fname, out_dir):
+    """Convert a .pts file to a model json."""
+    write_json(to_model(read_pts(fname)),
+               os.path.join(out_dir, f"{stem(fname)}.json"))
+
+
+def export_pts(fname, out_dir, num_points=None):
+    """Convert a model json to a .pts file."""
+    points, _ = read_points(fname, num_points)
+    write_pts(points, os.path.join(out_dir, f"{stem(fname)}.pts"))
+
+
+def write_model(name, points, out_dir):
+    """Write the model json of named points."""
+    write_json(to_model(points), os.path.join(out_dir, f"{name}.json"))
+
+
+def _run_one(job):
+    """Process pool entry point, return an error message or None."""
+    func, args = job
+    try:
+        func(*args)
+    except (OSError, ValueError, KeyError, TypeError) as err:
+        return f"{args[0]}: {err}"
+    return None
+
+
+def pool_map(func, jobs, workers=None):
+    """Run func over argument tuples in chunks, so a long stream is never
+    all queued. Return the number of jobs and the error messages."""
+    count, errors = 0, []
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = [(func, args) for args in itertools.islice(jobs, CHUNK)]
+            if not chunk:
+                return count, errors
+            results = pool.map(_run_one, chunk,
+                               chunksize=max(1, len(chunk) // 16))
+            errors += [err for err in results if err]
+            count += len(chunk)
+
+
+def read_csv(fname):
+    """Yield the (name, points) of each row of an image,x0,y0,... csv."""
+    with open(fname, newline="") as fid:
+        for row in csv.reader(fid):
+            if row and row[0] != "image":
+                yield stem(row[0]), np.array(row[1:], dtype=float)
+
+
+def write_csv(fnames, out, num_points=None):
+    """Write model json files as rows of a single csv.
+
+    Files that cannot be read, or hold another point count than the
+    first, are left out. Return the number of files and the error
+    messages, as pool_map does."""
+    errors, header = [], None
+    with open(f"{out}.tmp", "w", newline="") as fid:
+        writer = csv.writer(fid)
+        for fname in fnames:
+            try:
+                pos, _ = read_points(fname, num_points)
+            except (OSError, ValueError, KeyError, TypeError) as err:
+                errors.append(f"{fname}: {err}")
+                continue
+            if header is None:
+                header = ["image"] + [f"{a}{i}" for i in range(len(pos))
+                                      for a in "xy"]
+                writer.writerow(header)
+            elif 2 * len(pos) != len(header) - 1:
+                errors.append(f"{fname}: {len(pos)} points, the csv has "
+                              f"{(len(header) - 1) // 2}")
+                continue
+            writer.writerow([stem(fname)] +
+                            [f"{v:0.3f}" for v in pos.ravel()])
+    os.replace(f"{out}.tmp", out)
+    return len(fnames), errors
+
+
+class JsonStream:
+    """Decode the values of a json file one at a time, reading it a block
+    at a time."""
+
+    def __init__(self, fid, block=BLOCK):
+        self.fid = fid
+        self.block = block
+        self.text = ""
+        self.pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def peek(self):
+        """Return the next character that is not white space."""
+        while True:
+            while (self.pos < len(self.text) and
+                   self.text[self.pos] in " \t\r\n"):
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of json")
+
+    def take(self, char):
+        """Consume the next character, which must be char."""
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} in json, not "
+                             f"{self.text[self.pos]!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if self._fill():
+                    continue
+                raise
+            # A number ending the block may continue in the next.
+            if end < len(self.text) or not self._fill():
+                self.pos = end
+                return value
+
+    def items(self):
+        """Yield the (key, value) pairs of the object the file holds; an
+        array is yielded an item at a time, as (key, item) pairs."""
+        self.take("{")
+        while self.peek() != "}":
+            key = self.value()
+            self.take(":")
+            if self.peek() == "[":
+                self.take("[")
+                while self.peek() != "]":
+                    yield key, self.value()
+                    if self.peek() == ",":
+                        self.take(",")
+                self.take("]")
+            else:
+                yield key, self.value()
+            if self.peek() == ",":
+                self.take(",")
+
+    def _fill(self):
+        """Append the next block, dropping what has been decoded."""
+        block = self.fid.read(self.block)
+        if not block:
+            return False
+        self.text = self.text[self.pos:] + block
+        self.pos = 0
+        return True
+
+
+def iter_key(fname, key):
+    """Yield the items of the array under key in a json object file."""
+    with open(fname) as fid:
+        for name, item in JsonStream(fid).items():
+            if name == key:
+                yield item
+
+
+def read_coco(fname):
+    """Yield the (name, points) of each COCO keypoint annotation.
+
+    The file is read twice, a block at a time, for the image names and
+    then the annotations. An image with several annotations has them
+    numbered name, name_2... Keypoints that are not labelled (v = 0) are
+    NaN."""
+    images = {img["id"]: stem(img["file_name"])
+              for img in iter_key(fname, "images")}
+    seen = {}
+    for ann in iter_key(fname, "annotations"):
+        kps = np.asarray(ann["keypoints"], dtype=float).reshape(-1, 3)
+        name = images[ann["image_id"]]
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name}_{seen[name]}"
+        kps[kps[:, 2] == 0, :2] = np.nan
+        yield name, kps[:, :2]
+
+
+def keypoint_names(model_dict, num_points):
+    """Return the names of the saved points of a model, key_0, key_1..."""
+    index = model_dict.get("index")
+    if index is None:
+        return [str(i) for i in range(num_points)]
+    names = {i: f"{key}_{j}"
+             for key, idx in saved_index(index, model_dict["keys"]).items()
+             for j, i in enumerate(idx)}
+    return [names.get(i, str(i)) for i in range(num_points)]
+
+
+def write_coco(fnames, out, image_dir=None, num_points=None):
+    """Write model json files as a COCO keypoints file, of the first
+    num_points of each if given.
+
+    Annotations are written as they are read; files that cannot be read,
+    or hold another point count than the first, are left out. With
+    image_dir, the image of each file is looked for there to fill in its
+    size, left out if the image is missing or its header cannot be read.
+    Return the number of files and the error messages, as pool_map
+    does."""
+    errors, images, names = [], [], None
+    with open(f"{out}.tmp", "w") as fid:
+        fid.write('{"annotations": [')
+        for fname in fnames:
+            try:
+                pos, model_dict = read_points(fname, num_points)
+            except (OSError, ValueError, KeyError, TypeError) as err:
+                errors.append(f"{fname}: {err}")
+                continue
+            if names is None:
+                names = keypoint_names(model_dict, len(pos))
+            elif len(pos) != len(names):
+                errors.append(f"{fname}: {len(pos)} points, the file has "
+                              f"{len(names)}")
+                continue
+            i = len(images) + 1
+            image = dict(id=i, file_name=image_name(fname, image_dir))
+            if image_dir:
+                path = os.path.join(image_dir, image["file_name"])
+                try:
+                    image["width"], image["height"] = image_size(path)
+                except (OSError, ValueError):
+                    pass
+            images.append(image)
+            lo, hi = pos.min(axis=0), pos.max(axis=0)
+            kps = np.hstack([pos, np.full((len(pos), 1), 2.)])
+            ann = dict(id=i, image_id=i, category_id=1,
+                       num_keypoints=len(pos),
+                       keypoints=np.round(kps, 3).ravel().tolist(),
+                       bbox=[*lo.tolist(), *(hi - lo).tolist()])
+            fid.write(("," if i > 1 else "") + json.dumps(ann))
+        if names is None:
+            names = keypoint_names(model, len(drawn_indices(
+                model["index"], model["keys"])))[:num_points]
+        category = dict(id=1, name="face", keypoints=names, skeleton=[])
+        fid.write('], "images": %s, "categories": [%s]}' %
+                  (json.dumps(images), json.dumps(category)))
+    os.replace(f"{out}.tmp", out)
+    return len(fnames), errors
+
+
+def image_name(fname, image_dir):
+    """Return the image file name of a model json, found in image_dir."""
+    name = stem(fname)
+    if image_dir:
+        for ext in IMAGE_EXTENSIONS:
+            if os.path.exists(os.path.join(image_dir, name + ext)):
+                return name + ext
+    return name + ".jpg"
+
+
+def main(argv=None):
+    """Convert landmark files."""
+    parser = argparse.ArgumentParser(
+        prog="flt convert", description="Convert landmark file formats.")
+    parser.add_argument("direction", choices=["import", "export"])
+    parser.add_argument("format", choices=["pts", "csv", "coco"])
+    parser.add_argument("out", help="output directory, or csv/coco file")
+    parser.add_argument("inputs", nargs="+", help="files to convert")
+    parser.add_argument("--images", help="image directory, for coco sizes")
+    parser.add_argument("--points", type=int,
+                        help="export only the first points, eg. 68")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes")
+    args = parser.parse_args(argv)
+
+    if args.direction == "import" or args.format == "pts":
+        os.makedirs(args.out, exist_ok=True)
+    errors = []
+    if args.direction == "import" and args.format == "pts":
+        count, errors = pool_map(import_pts, ((f, args.out)
+                                              for f in args.inputs), args.jobs)
+    elif args.direction == "import":
+        read = read_csv if args.format == "csv" else read_coco
+        rows = itertools.chain.from_iterable(map(read, args.inputs))
+        count, errors = pool_map(write_model, ((name, points, args.out)
+                                               for name, points in rows),
+                                 args.jobs)
+    elif args.format == "pts":
+        count, errors = pool_map(export_pts, ((f, args.out, args.points)
+                                              for f in args.inputs),
+                                 args.jobs)
+    elif args.format == "csv":
+        count, errors = write_csv(args.inputs, args.out, args.points)
+    else:
+        count, errors = write_coco(args.inputs, args.out, args.images,
+                                   args.points)
+
+    for err in errors:
+        print(err, file=sys.stderr)
+    print(f"{count - len(errors)} of {count} converted to {args.out}",
+          file=sys.stderr)
+    return 1 if errors else 0
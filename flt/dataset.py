@@ -0,0 +1,323 @@
+"""A compact binary landmark dataset, with memory mapped reads.
+
+A dataset is a directory holding:
+
+* ``header.json`` - the shared ``index``, ``keys`` and ``num_points``.
+* ``points.f32`` - float32 positions, one (num_points, 2) row per image.
+* ``names.txt`` - the image file name of each row, one per line.
+
+Rows are only ever appended, so a dataset can be grown without rewriting
+it. Convert existing files with:
+
+    flt dataset json OUT_DIR landmarks/*.json
+    flt dataset log OUT_DIR lm.txt
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from .model import model, read_json, write_json
+from .store import (drawn_indices, full_positions, index_size, saved_index,
+                    saved_positions)
+
+HEADER = "header.json"
+POINTS = "points.f32"
+NAMES = "names.txt"
+
+
+class DatasetWriter:
+    """Append landmark rows to a dataset, creating it if needed."""
+
+    def __init__(self, path, num_points, index=model["index"],
+                 keys=model["keys"]):
+        self.path = path
+        header_fname = os.path.join(path, HEADER)
+        if os.path.exists(header_fname):
+            self.header = read_json(header_fname)
+            if self.header["num_points"] != num_points:
+                raise ValueError(
+                    f"{path} holds {self.header['num_points']} points, "
+                    f"not {num_points}.")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.header = dict(version=1, num_points=num_points,
+                               index=index, keys=keys)
+            write_json(self.header, header_fname)
+        _truncate(path, num_points)
+        self._points = open(os.path.join(path, POINTS), "ab")
+        self._names = open(os.path.join(path, NAMES), "a")
+
+    def append(self, fname, pos):
+        """Append the positions of a single image."""
+        self.extend([fname], [pos])
+
+    def extend(self, fnames, pos):
+        """Append the positions of many images, shape (M, num_points, 2)."""
+        pos = np.asarray(pos, dtype="<f4").reshape(
+            len(fnames), self.header["num_points"], 2)
+        self._points.write(pos.tobytes())
+        self._names.write("".join(f"{_name(f)}\n" for f in fnames))
+
+    def flush(self):
+        """Flush the positions, then the names that index them."""
+        self._points.flush()
+        self._names.flush()
+
+    def close(self):
+        """Flush and close the files."""
+        self.flush()
+        self._points.close()
+        self._names.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Dataset:
+    """Read a dataset, memory mapping the positions.
+
+    Only rows with both positions and a name are visible, so a dataset
+    left part written by a crash still reads."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_json(os.path.join(path, HEADER))
+        self.index = self.header["index"]
+        self.keys = self.header["keys"]
+        with open(os.path.join(path, NAMES), newline="") as fid:
+            self.names = fid.read().split("\n")[:-1]
+        num_points = self.header["num_points"]
+        fname = os.path.join(path, POINTS)
+        rows = os.path.getsize(fname) // (num_points * 2 * 4)
+        rows = min(rows, len(self.names))
+        self.names = self.names[:rows]
+        if rows:
+            self.points = np.memmap(fname, dtype="<f4", mode="r",
+                                    shape=(rows, num_points, 2))
+        else:
+            self.points = np.zeros((0, num_points, 2), dtype="<f4")
+        self._rows = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        return self.names[i], self.points[i]
+
+    def __contains__(self, fname):
+        return fname in self._rows
+
+    def get(self, fname):
+        """Return the latest positions saved for an image file name."""
+        return self.points[self._rows[fname]]
+
+    def to_dict(self, i):
+        """Return a row as a ``{pos, index, keys}`` model dictionary."""
+        return dict(index=self.index, keys=self.keys,
+                    pos=self.points[i].astype(float).tolist())
+
+
+def _truncate(path, num_points):
+    """Cut the files back to the rows with both positions and a name.
+
+    A crash can leave part of a row, or rows without names; appending
+    after them would pair later names with the wrong positions."""
+    points_fname = os.path.join(path, POINTS)
+    names_fname = os.path.join(path, NAMES)
+    row_bytes = num_points * 2 * 4
+    rows = 0
+    if os.path.exists(points_fname):
+        rows = os.path.getsize(points_fname) // row_bytes
+    ends = [0]
+    if os.path.exists(names_fname):
+        with open(names_fname, "rb") as fid:
+            for line in fid:
+                if line.endswith(b"\n"):
+                    ends.append(ends[-1] + len(line))
+    rows = min(rows, len(ends) - 1)
+    for fname, size in ((points_fname, rows * row_bytes),
+                        (names_fname, ends[rows])):
+        if os.path.exists(fname) and os.path.getsize(fname) > size:
+            os.truncate(fname, size)
+
+
+def _name(fname):
+    """Return a name safe to store as a single line."""
+    return fname.replace("\n", " ")
+
+
+def parse_log_line(line):
+    """Parse a print_pos line, return the file name and positions."""
+    fname, _, pos = line.partition(" : ")
+    return json.loads(fname), json.loads(pos)
+
+
+def log_records(fname):
+    """Yield the line number, file name and positions of each line of a
+    print_pos log; the name and positions of a line that does not parse,
+    such as one torn by a crash, are None."""
+    with open(fname) as fid:
+        for lineno, line in enumerate(fid, 1):
+            if not line.strip():
+                continue
+            try:
+                name, pos = parse_log_line(line)
+            except ValueError:
+                name, pos = None, None
+            yield lineno, name, pos
+
+
+def read_log(fname, skipped=None):
+    """Yield the (file name, positions) of each line of a print_pos log.
+
+    Lines that do not parse are skipped, and their line numbers appended
+    to skipped if given."""
+    for lineno, name, pos in log_records(fname):
+        if name is None:
+            if skipped is not None:
+                skipped.append(lineno)
+            continue
+        yield name, pos
+
+
+def fit_row(pos, index, keys, num_points=None):
+    """Return positions in the layout of a dataset of num_points, or None
+    if they do not fit it.
+
+    Positions of the model, saved with every point or only the drawn ones,
+    are taken to the dataset's layout, by default the saved one; others
+    only fit a dataset of their own count."""
+    try:
+        pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+    except (TypeError, ValueError):
+        return None
+    drawn = drawn_indices(index, keys)
+    count = index_size(index)
+    of_model = len(pos) in (len(drawn), count)
+    if of_model and num_points in (None, len(drawn)):
+        return saved_positions(pos, index, keys)
+    if of_model and num_points == count:
+        return full_positions(pos, index, keys)
+    if num_points in (None, len(pos)):
+        return pos
+    return None
+
+
+def header_for(num_points, index, keys):
+    """Return the index and keys of a dataset of num_points rows of a
+    model, numbering the groups of its saved layout, or a single group of
+    every point if the rows are not of the model."""
+    if num_points == len(drawn_indices(index, keys)):
+        return saved_index(index, keys), list(keys)
+    if num_points == index_size(index):
+        return index, list(keys)
+    return dict(points=list(range(num_points))), ["points"]
+
+
+def _num_points(path):
+    """Return the point count of an existing dataset, or None."""
+    fname = os.path.join(path, HEADER)
+    if not os.path.exists(fname):
+        return None
+    return read_json(fname)["num_points"]
+
+
+def from_log(log_fname, path, chunk=10000, skipped=None):
+    """Convert a ``flt >> lm.txt`` log to a dataset, return the row count.
+
+    Lines of the built in model, with 68 or 70 points, are stored in the
+    saved layout. The numbers of lines that do not parse, or do not fit
+    the dataset's point count, are appended to skipped."""
+    num_points = _num_points(path)
+    writer, names, rows, count = None, [], [], 0
+    for lineno, name, pos in log_records(log_fname):
+        row = None
+        if name is not None:
+            row = fit_row(pos, model["index"], model["keys"], num_points)
+        if row is None:
+            if skipped is not None:
+                skipped.append(lineno)
+            continue
+        if writer is None:
+            num_points = len(row)
+            writer = DatasetWriter(
+                path, num_points,
+                *header_for(num_points, model["index"], model["keys"]))
+        names.append(str(name))
+        rows.append(row)
+        if len(rows) == chunk:
+            writer.extend(names, rows)
+            count += len(rows)
+            names, rows = [], []
+    if rows:
+        writer.extend(names, rows)
+        count += len(rows)
+    if writer:
+        writer.close()
+    return count
+
+
+def from_json(fnames, path, skipped=None):
+    """Convert saved model json files to a dataset, return the row count.
+
+    Rows are named by the json file stem, the image name save_mdl uses, and
+    stored in the saved layout of the first file's model. The names of
+    files that cannot be read, or do not fit the dataset, are appended to
+    skipped."""
+    num_points = _num_points(path)
+    writer, count = None, 0
+    for fname in fnames:
+        try:
+            model_in = read_json(fname)
+            row = fit_row(model_in["pos"], model_in["index"],
+                           model_in["keys"], num_points)
+        except (OSError, ValueError, KeyError, TypeError):
+            row = None
+        if row is None:
+            if skipped is not None:
+                skipped.append(fname)
+            continue
+        if writer is None:
+            num_points = len(row)
+            writer = DatasetWriter(
+                path, num_points,
+                *header_for(num_points, model_in["index"], model_in["keys"]))
+        _, name = os.path.split(fname)
+        writer.append(os.path.splitext(name)[0], row)
+        count += 1
+    if writer:
+        writer.close()
+    return count
+
+
+def main(argv=None):
+    """Convert landmark files to a dataset."""
+    parser = argparse.ArgumentParser(
+        prog="flt dataset", description="Convert landmarks to a dataset.")
+    parser.add_argument("source", choices=["json", "log"],
+                        help="saved model json files, or a print_pos log")
+    parser.add_argument("out", help="dataset directory, appended to")
+    parser.add_argument("files", nargs="+", help="files to convert")
+    args = parser.parse_args(argv)
+    if args.source == "json":
+        skipped = []
+        count = from_json(args.files, args.out, skipped)
+        for fname in skipped:
+            print(f"{fname}: unreadable or of another point count, skipped",
+                  file=sys.stderr)
+    else:
+        count = 0
+        for fname in args.files:
+            skipped = []
+            count += from_log(fname, args.out, skipped=skipped)
+            for lineno in skipped:
+                print(f"{fname}:{lineno}: unreadable or of another point "
+                      "count, skipped", file=sys.stderr)
+    print(f"{count} rows written to {args.out}", file=sys.stderr)
+    return 0
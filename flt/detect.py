@@ -0,0 +1,76 @@
+"""CPU face detectors, and fitting a model to what they find.
+
+A detector is a callable taking a (height, width) uint8 grayscale array
+and returning a face box (x, y, width, height), or None. Add detectors to
+DETECTORS with register_detector().
+"""
+import importlib.util
+
+import numpy as np
+
+DETECTORS = {}
+
+
+def register_detector(name):
+    """Decorate a detector class, making it available by name."""
+    def register(cls):
+        DETECTORS[name] = cls
+        return cls
+    return register
+
+
+def get_detector(name):
+    """Return a new detector by name."""
+    return DETECTORS[name]()
+
+
+def detector_available(name):
+    """Return True if the modules a detector needs import."""
+    return all(importlib.util.find_spec(module) is not None
+               for module in getattr(DETECTORS[name], "requires", ()))
+
+
+@register_detector("centre")
+class CentreDetector:
+    """Assume a face in the middle of the image, as the default model is
+    placed in an 800 x 800 frame."""
+    fraction = 0.45
+
+    def __call__(self, gray):
+        height, width = gray.shape[:2]
+        size = self.fraction * min(width, height)
+        return (width - size) / 2, (height - size) / 2, size, size
+
+
+@register_detector("haar")
+class HaarDetector:
+    """The OpenCV frontal face Haar cascade, returning the largest face.
+
+    Requires opencv-python, imported when the detector is made."""
+    requires = ("cv2",)
+
+    def __init__(self):
+        import cv2
+        self.cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+    def __call__(self, gray):
+        faces = self.cascade.detectMultiScale(gray, 1.1, 5)
+        if not len(faces):
+            return None
+        return tuple(max(faces, key=lambda f: f[2] * f[3]))
+
+
+def fit_to_box(pos, box):
+    """Scale and translate positions so their bounds fill a box."""
+    pos = np.asarray(pos, dtype=float)
+    x, y, width, height = box
+    lo, hi = pos.min(axis=0), pos.max(axis=0)
+    scale = min(width / (hi - lo)[0], height / (hi - lo)[1])
+    return (pos - (lo + hi) / 2) * scale + (x + width / 2, y + height / 2)
+
+
+def initialise(gray, pos, detector):
+    """Return the positions fitted to the face found, or None."""
+    box = detector(gray)
+    return None if box is None else fit_to_box(pos, box)
@@ -0,0 +1,102 @@
+"""Read and write models and images off the GUI thread."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore, QtGui
+
+from .model import read_json, write_json_atomic
+
+
+class FileIO(QtCore.QObject):
+    """Model and image reads and writes on worker threads, completed by
+    signals on the GUI thread.
+
+    Writes to a file are coalesced: while one is in progress only the
+    newest pending model is kept, and written next. busy is emitted with
+    the number of unfinished requests whenever it changes, and failed with
+    the file name and a message.
+    """
+    model_read = QtCore.pyqtSignal(str, object)
+    image_read = QtCore.pyqtSignal(str, object)
+    written = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str, str)
+    busy = QtCore.pyqtSignal(int)
+    _finished = QtCore.pyqtSignal()
+
+    def __init__(self, cache=None, workers=2, parent=None):
+        super(FileIO, self).__init__(parent)
+        self.cache = cache
+        self.pending = 0
+        self._writes = {}
+        self._writing = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._finished.connect(self._done)
+
+    def read_model(self, fname):
+        """Read a model json, emitting model_read when done."""
+        self._submit(self._read_model, fname)
+
+    def read_image(self, fname):
+        """Decode an image, through the cache if any, emitting image_read
+        when done."""
+        self._submit(self._read_image, fname)
+
+    def write_model(self, fname, model_dict):
+        """Write a model json, replacing any write of fname not started."""
+        with self._lock:
+            queued = fname in self._writes or fname in self._writing
+            self._writes[fname] = model_dict
+            if queued:
+                return
+            self._writing.add(fname)
+        self._submit(self._write_model, fname)
+
+    def shutdown(self, wait=True):
+        """Stop the worker threads, by default finishing pending writes."""
+        self._pool.shutdown(wait=wait)
+
+    def _submit(self, func, fname):
+        """Run func(fname) on a worker, counting it as pending."""
+        self.pending += 1
+        self.busy.emit(self.pending)
+        future = self._pool.submit(func, fname)
+        future.add_done_callback(lambda _: self._finished.emit())
+
+    def _done(self):
+        """Count a finished request, on the GUI thread."""
+        self.pending -= 1
+        self.busy.emit(self.pending)
+
+    def _read_model(self, fname):
+        """Worker: read a model json."""
+        try:
+            self.model_read.emit(fname, read_json(fname))
+        except (OSError, ValueError) as err:
+            self.failed.emit(fname, f"Cannot read {fname}: {err}")
+
+    def _read_image(self, fname):
+        """Worker: decode an image."""
+        if self.cache is not None:
+            image = self.cache.get(fname)
+        else:
+            image = QtGui.QImage(fname)
+        if image.isNull():
+            self.failed.emit(fname, f"Cannot load {fname}.")
+        else:
+            self.image_read.emit(fname, image)
+
+    def _write_model(self, fname):
+        """Worker: write the newest model for fname until none is left."""
+        while True:
+            with self._lock:
+                if fname not in self._writes:
+                    self._writing.discard(fname)
+                    return
+                model_dict = self._writes.pop(fname)
+            try:
+                write_json_atomic(model_dict, fname)
+            except (OSError, TypeError, ValueError) as err:
+                self.failed.emit(fname, f"Cannot write {fname}: {err}")
+            else:
+                self.written.emit(fname)
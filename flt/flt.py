@@ -1,10 +1,31 @@
 """A simple application to label images of faces."""
 import sys
 import os
-from pkg_resources import resource_filename
+import argparse
+import contextlib
+import time
+import collections
+import numpy as np
 from PyQt5 import QtCore, QtGui, QtWidgets
 
-from .model import model, read_json, write_json
+from .annolog import AnnotationLog
+from .batch import landmark_name
+from .detect import DETECTORS, detector_available
+from .fileio import FileIO
+from .gallery import GalleryView
+from .history import History
+from .imageinfo import list_images
+from .initialise import Initialiser
+from .journal import Journal
+from .model import model
+from .prefetch import ImageCache
+from .refine import Refiner, contour_indices
+from .sequence import VIDEO_EXTENSIONS, flow_available, open_sequence
+from .spatial import GridIndex
+from .store import LandmarkStore
+from .style import THEMES, Style
+from .tiles import TiledImageItem
+from .timing import PROFILER, timed
 
 # -----------------------------------------------------------------------------
 # Constants
@@ -14,20 +35,19 @@ from .model import model, read_json, write_json
 WIDTH = 800
 HEIGHT = 800
 MARGIN = 10
+ICON = os.path.join(os.path.dirname(__file__), "data", "icon.png")
+PREFETCH = 4
+CACHE_BYTES = 512 * 2**20
+AUTOSAVE_MS = 3000
+TILED_PIXELS = 8 * 2**20
 
 
-class Pen:
-    line = 1.0
-    red_pen = QtGui.QPen(QtGui.QColor("red"), line)
-    grn_pen = QtGui.QPen(QtGui.QColor("green"), line)
-    yel_pen = QtGui.QPen(QtGui.QColor("yellow"), line)
-
-    @classmethod
-    def set_line(cls, line_width):
-        cls.line = line_width
-        cls.red_pen = QtGui.QPen(QtGui.QColor("red"), cls.line)
-        cls.grn_pen = QtGui.QPen(QtGui.QColor("green"), cls.line)
-        cls.yel_pen = QtGui.QPen(QtGui.QColor("yellow"), cls.line)
+def stroke(path):
+    """Return the MARGIN wide stroke of a path, used as an item shape."""
+    qp = QtGui.QPainterPathStroker()
+    qp.setWidth(MARGIN)
+    qp.setCapStyle(QtCore.Qt.SquareCap)
+    return qp.createStroke(path)
 
 # -----------------------------------------------------------------------------
 # Model
@@ -45,38 +65,40 @@ class Marker(QtWidgets.QGraphicsPathItem):
     square.addRect(QtCore.QRectF(0, -5, 0, 10))
     square.addRect(QtCore.QRectF(-5, 0, 10, 0))
 
+    cross_shape = stroke(cross)
+    square_shape = stroke(square)
+    bounds = square_shape.boundingRect()
+
     def __init__(self, group_item, index):
         super(Marker, self).__init__()
         self.m_group_item = group_item
         self.m_index = index
+        self.m_hover = False
+        self.m_shape = Marker.cross_shape
         self.setPath(Marker.cross)
-        self.setBrush(QtGui.QBrush(QtCore.Qt.NoBrush))
-        self.setPen(self.default_pen())
 
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable, True)
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable, True)
         self.setFlag(QtWidgets.QGraphicsItem.ItemSendsGeometryChanges, True)
-        self.setAcceptHoverEvents(True)
         self.setZValue(20)
         self.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
 
     def default_pen(self):
-        """return yellow pen for first Marker, else green. """
-        return Pen.yel_pen if self.m_index == 0 else Pen.grn_pen
-
-    def hoverEnterEvent(self, event):
-        """Override super."""
-        self.setPath(Marker.square)
-        self.setPen(Pen.red_pen)
-        self.setBrush(QtGui.QColor(255, 0, 0, 32))
-        super(Marker, self).hoverEnterEvent(event)
-
-    def hoverLeaveEvent(self, event):
-        """Override super."""
-        self.setPath(Marker.cross)
-        self.setPen(self.default_pen())
-        self.setBrush(QtGui.QBrush(QtCore.Qt.NoBrush))
-        super(Marker, self).hoverLeaveEvent(event)
+        """return the first marker pen for the first Marker, else the pen of
+        its group. """
+        if self.m_index == 0:
+            return self.scene().style.first_pen
+        return self.m_group_item.m_pen
+
+    def set_hover(self, hover):
+        """Highlight the marker, hover is tracked by the scene."""
+        self.m_hover = hover
+        if hover:
+            self.m_shape = Marker.square_shape
+            self.setPath(Marker.square)
+        else:
+            self.m_shape = Marker.cross_shape
+            self.setPath(Marker.cross)
 
     def mouseReleaseEvent(self, event):
         """Override super."""
@@ -91,49 +113,101 @@ class Marker(QtWidgets.QGraphicsPathItem):
         return super(Marker, self).itemChange(change, value)
 
     def shape(self):
-        """Override super."""
-        qp = QtGui.QPainterPathStroker()
-        qp.setWidth(MARGIN)
-        qp.setCapStyle(QtCore.Qt.SquareCap)
-        shape = qp.createStroke(self.path())
-        return shape
-
-    def update(self):
-        """Override super."""
-        self.setPen(self.default_pen())
-        super(Marker, self).update()
+        """Override super, the stroke of each path is built once."""
+        return self.m_shape
+
+    def boundingRect(self):
+        """Override super, the pen is not the item's own."""
+        return Marker.bounds
+
+    def paint(self, painter, option, widget=None):
+        """Override super, drawing with the shared scene style, and a
+        dashed square while selected, as Qt's own paint would."""
+        style = self.scene().style
+        if self.m_hover:
+            painter.setPen(style.hover_pen)
+            painter.setBrush(style.hover_brush)
+        else:
+            painter.setPen(self.default_pen())
+            painter.setBrush(style.no_brush)
+        painter.drawPath(self.path())
+        if option.state & QtWidgets.QStyle.State_Selected:
+            painter.setPen(style.selected_pen)
+            painter.setBrush(style.no_brush)
+            painter.drawRect(Marker.square.boundingRect())
 
 
 class LineGroup(QtWidgets.QGraphicsPathItem):
     """This class groups the points to semantic regions, eg: right eye... """
 
-    def __init__(self, parent=None):
+    def __init__(self, store, key, parent=None):
         super(LineGroup, self).__init__(parent)
-        self.setPen(Pen.grn_pen)
-        self.setBrush(QtGui.QBrush(QtCore.Qt.NoBrush))
         self.setZValue(10)
-        self.setAcceptHoverEvents(True)
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable, True)
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable, True)
         self.setFlag(QtWidgets.QGraphicsItem.ItemSendsGeometryChanges, True)
         self.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
-        self.m_points = []
+        self.m_store = store
+        self.m_key = key
+        self.m_offset = QtCore.QPointF(0, 0)
         self.m_items = []
-
+        self.m_deferred = 0
+        self.m_dirty = False
+        self.m_shape = None
+        self.m_pen = None
+
+    @property
+    def m_points(self):
+        """The stored points of the group in item coordinates."""
+        return [QtCore.QPointF(x - self.m_offset.x(), y - self.m_offset.y())
+                for x, y in self.m_store.group(self.m_key)]
+
+    @timed("set_path")
     def set_path(self):
-        """Set the painter path from the stored points."""
+        """Set the painter path from the stored points.
+
+        Without markers, a cross is drawn at each point in the same path.
+        While deferred, only mark the path as needing a rebuild."""
+        if self.m_deferred:
+            PROFILER.count("path_deferred")
+            self.m_dirty = True
+            return
+        self.m_dirty = False
         painter_path = QtGui.QPainterPath()
         painter_path.addPolygon(QtGui.QPolygonF(self.m_points))
+        if not self.m_items:
+            for point in self.m_points:
+                painter_path.addPath(Marker.cross.translated(point))
         self.setPath(painter_path)
-
-    def add_point(self, p):
-        """Add a single point. """
-        self.m_points.append(p)
-        self.set_path()
-        item = Marker(self, len(self.m_points) - 1)
-        self.scene().addItem(item)
-        self.m_items.append(item)
-        item.setPos(p)
+        self.m_shape = None
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """Suspend path rebuilds, rebuilding the path once on exit."""
+        self.m_deferred += 1
+        try:
+            yield self
+        finally:
+            self.m_deferred -= 1
+            if not self.m_deferred and self.m_dirty:
+                self.set_path()
+
+    def add_markers(self):
+        """Add a marker for each stored point. """
+        with self.deferred():
+            for i, (x, y) in enumerate(self.m_store.group(self.m_key)):
+                item = Marker(self, i)
+                self.scene().addItem(item)
+                self.m_items.append(item)
+                item.setPos(x, y)
+            self.m_dirty = True
+
+    def refresh(self):
+        """Move the markers to the stored points and rebuild the path once."""
+        with self.deferred():
+            for i, (x, y) in enumerate(self.m_store.group(self.m_key)):
+                self.move_item(i, QtCore.QPointF(x, y))
+            self.m_dirty = True
 
     def delete_markers(self):
         """Fully delete the group markers."""
@@ -141,16 +215,13 @@ class LineGroup(QtWidgets.QGraphicsPathItem):
             item = self.m_items.pop(0)
             self.scene().removeItem(item)
             del item
-
-    def add_points(self, pts):
-        """Add points from a list of (x, y) tuples."""
-        for x, y in pts:
-            self.add_point(QtCore.QPointF(x, y))
+        self.set_path()
 
     def move_point(self, index, pos):
-        """Move a point and update the painter path."""
-        if 0 <= index < len(self.m_points):
-            self.m_points[index] = self.mapFromScene(pos)
+        """Store a point position and update the painter path."""
+        if 0 <= index < len(self.m_items):
+            i = self.m_store.index[self.m_key][index]
+            self.m_store.set_point(i, pos.x(), pos.y())
             self.set_path()
 
     def move_item(self, index, pos):
@@ -161,60 +232,88 @@ class LineGroup(QtWidgets.QGraphicsPathItem):
             item.setPos(pos)
             item.setEnabled(True)
 
+    @timed("group_shape")
     def shape(self):
-        """Override super."""
-        qp = QtGui.QPainterPathStroker()
-        qp.setWidth(MARGIN)
-        qp.setCapStyle(QtCore.Qt.SquareCap)
-        shape = qp.createStroke(self.path())
-        return shape
+        """Override super, the stroke is cached until the path changes."""
+        if self.m_shape is None:
+            self.m_shape = stroke(self.path())
+        return self.m_shape
 
     def itemChange(self, change, value):
         """Override super."""
         if change == QtWidgets.QGraphicsItem.ItemPositionHasChanged:
-            for i, point in enumerate(self.m_points):
-                self.move_item(i, self.mapToScene(point))
+            delta = self.pos() - self.m_offset
+            self.m_offset = self.pos()
+            self.m_store.translate(delta.x(), delta.y(), self.m_key)
+            for i, (x, y) in enumerate(self.m_store.group(self.m_key)):
+                self.move_item(i, QtCore.QPointF(x, y))
         return super(LineGroup, self).itemChange(change, value)
 
-    def hoverEnterEvent(self, event):
-        """Override super."""
-        self.setPen(Pen.red_pen)
-        super(LineGroup, self).hoverEnterEvent(event)
-
-    def hoverLeaveEvent(self, event):
-        """Override super."""
-        self.setPen(Pen.grn_pen)
-        super(LineGroup, self).hoverLeaveEvent(event)
+    def restyle(self, pen):
+        """Set the shared pen of the group, also drawn by its markers."""
+        self.m_pen = pen
+        self.setPen(pen)
 
-    def update(self):
-        """Override super"""
-        self.setPen(Pen.grn_pen)
-        for item in self.m_items:
-            item.update()
-        super(LineGroup, self).update()
+    def set_hover(self, hover):
+        """Highlight the group, hover is tracked by the scene."""
+        self.setPen(self.scene().style.hover_pen if hover else self.m_pen)
 
 
 class Model:
-    """Landmarking model"""
+    """Landmarking model, drawing the positions held in a LandmarkStore.
+
+    A scene may hold several models, one per face, told apart by their
+    instance_id."""
 
-    def __init__(self, scene=None):
+    def __init__(self, scene=None, store=None, instance_id=0):
         super(Model, self).__init__()
         self.scene = scene
+        self.instance_id = instance_id
         self.groups = []
-        self.positions = []
-        self.load_model()
+        self.markers = {}
+        self.detailed = True
+        self.store = None
+        self.grid = None
+        self.history = None
+        if store is None:
+            self.load_model()
+        else:
+            self.load_store(store)
+
+    @property
+    def positions(self):
+        """The (N, 2) array of landmark positions."""
+        return self.store.pos
+
+    @property
+    def index(self):
+        """The point indices of each group."""
+        return self.store.index
+
+    @property
+    def keys(self):
+        """The names of the drawn groups."""
+        return self.store.keys
 
     def load_model(self, model_dict=model):
         """Load a model from a dictionary."""
+        self.load_store(LandmarkStore.from_dict(model_dict))
+
+    @timed("load_model")
+    def load_store(self, store):
+        """Draw the positions of a store."""
         self.delete_model()
-        self.index = model_dict["index"]
-        self.positions = model_dict["pos"]
-        self.keys = model_dict["keys"]
+        self.store = store
         for key in self.keys:
-            self.add_group([self.positions[i] for i in self.index[key]], key)
+            self.add_group(key)
+        drawn = {int(i) for key in self.keys for i in self.index[key]}
+        self.grid = GridIndex(self.store, sorted(drawn), MARGIN)
+        self.history = History(self.store)
 
     def delete_model(self):
         """Fully delete a model."""
+        self.scene.set_hover(None)
+        self.markers = {}
         while self.groups:
             group = self.groups.pop(0)
             group.delete_markers()
@@ -231,38 +330,147 @@ class Model:
         for group in self.groups:
             group.setSelected(False)
 
-    def scale_model(self, factor):
-        """Scale the model by a factor."""
-        pos = [[factor * p[0], factor * p[1]] for p in self.get_positions()]
-        self.load_model(dict(index=self.index, keys=self.keys, pos=pos))
+    @contextlib.contextmanager
+    def deferred(self):
+        """Suspend path rebuilds in every group until exit."""
+        with contextlib.ExitStack() as stack:
+            for group in self.groups:
+                stack.enter_context(group.deferred())
+            yield self
+
+    def refresh(self, key=None):
+        """Update the drawn items in place from the store."""
+        for group in self.groups:
+            if key is None or group.m_key == key:
+                group.refresh()
 
-    def add_group(self, pts, label=None):
-        """Add a new group to the model."""
-        group = LineGroup()
-        if label:
-            group.setToolTip(label)
+    def refresh_points(self, indices):
+        """Update in place the groups drawing any of the indices."""
+        for group in self.groups:
+            if np.isin(self.index[group.m_key], indices).any():
+                group.refresh()
+
+    @contextlib.contextmanager
+    def edit(self, label=""):
+        """Record the changes made within as one undoable edit."""
+        self.history.begin()
+        try:
+            yield self
+        finally:
+            self.history.commit(label)
+
+    def undo(self):
+        """Undo the last edit in place."""
+        indices = self.history.undo()
+        if indices is not None:
+            self.refresh_points(indices)
+
+    def redo(self):
+        """Redo the last undone edit in place."""
+        indices = self.history.redo()
+        if indices is not None:
+            self.refresh_points(indices)
+
+    def set_positions(self, pos):
+        """Move every landmark, as one undoable edit."""
+        if np.shape(pos) != self.positions.shape:
+            return
+        with self.edit("set positions"):
+            self.store.set_positions(pos)
+        self.refresh()
+
+    def set_points(self, indices, pos, label="move"):
+        """Move the landmarks at indices, as one undoable edit."""
+        with self.edit(label):
+            self.store.move(indices, pos - self.store.pos[indices])
+        self.refresh_points(indices)
+
+    def scale_model(self, factor, key=None, centre=(0, 0)):
+        """Scale the model, or a group, by a factor about centre.
+
+        If centre is None, scale about the centroid."""
+        with self.edit("scale"):
+            self.store.scale(factor, key, centre)
+        self.refresh(key)
+
+    def translate_model(self, dx, dy, key=None):
+        """Translate the model, or a group."""
+        with self.edit("translate"):
+            self.store.translate(dx, dy, key)
+        self.refresh(key)
+
+    def rotate_model(self, angle, key=None, centre=None):
+        """Rotate the model, or a group, by angle degrees about centre.
+
+        If centre is None, rotate about the centroid."""
+        with self.edit("rotate"):
+            self.store.rotate(angle, key, centre)
+        self.refresh(key)
+
+    def transform_model(self, matrix, key=None):
+        """Apply a 2x3 affine matrix to the model, or a group."""
+        with self.edit("transform"):
+            self.store.affine(matrix, key)
+        self.refresh(key)
+
+    def add_group(self, key):
+        """Add a new group to the model, drawing the stored points of key."""
+        group = LineGroup(self.store, key)
+        group.setToolTip(key)
+        group.restyle(self.scene.style.group_pen(key, len(self.groups)))
         self.scene.addItem(group)
-        group.add_points(pts)
         self.groups.append(group)
+        if self.detailed:
+            self.add_markers(group)
+        else:
+            group.set_path()
         return group
 
-    def get_positions(self):
-        """Get the positions of all the markers in all the groups."""
-        self.positions = []
+    def add_markers(self, group):
+        """Give a group its interactive markers."""
+        group.add_markers()
+        for i, item in zip(self.store.index[group.m_key], group.m_items):
+            self.markers[int(i)] = item
+
+    def set_detail(self, detailed):
+        """Draw markers as items, else as part of each group path.
+
+        Without markers, a zoomed out model is a few items to paint, and
+        can still be dragged by group."""
+        if detailed == self.detailed:
+            return
+        self.detailed = detailed
+        self.scene.set_hover(None)
+        self.markers = {}
         for group in self.groups:
-            for item in group.m_items:
-                self.positions.append([item.pos().x(), item.pos().y()])
+            if detailed:
+                self.add_markers(group)
+            else:
+                group.delete_markers()
+
+    def owns(self, item):
+        """Return True if a marker or group item belongs to the model."""
+        if isinstance(item, Marker):
+            item = item.m_group_item
+        return item in self.groups
+
+    def marker_at(self, pos, radius=MARGIN):
+        """Return the marker nearest a scene position within radius."""
+        i = self.grid.nearest(pos.x(), pos.y(), radius)
+        return self.markers.get(i)
+
+    def get_positions(self):
+        """Get the positions of all the landmarks, without copying."""
         return self.positions
 
     def to_dict(self):
         """Return a dictionary of the model."""
-        return dict(index=self.index, keys=self.keys,
-                    pos=self.get_positions())
+        return self.store.to_dict()
 
-    def update(self):
-        """Redraw the model as soon as possilble."""
-        for group in self.groups:
-            group.update()
+    def restyle(self):
+        """Give each group its pen from the scene style."""
+        for i, group in enumerate(self.groups):
+            group.restyle(self.scene.style.group_pen(group.m_key, i))
 
 
 # -----------------------------------------------------------------------------
@@ -276,28 +484,203 @@ class LabelerScene(QtWidgets.QGraphicsScene):
     def __init__(self, parent):
         super(LabelerScene, self).__init__(parent)
         self.image = QtWidgets.QGraphicsPixmapItem()
+        self.tiled_image = TiledImageItem()
         self.image_fname = "no_image"
+        self.log = None
+        self.hovered = None
+        self.style = Style()
         self.model = Model(scene=self)
+        self.models = [self.model]
+        self.snap = False
+        self.refiner = Refiner(parent=self)
+        self.refiner.ready.connect(self.apply_refine)
         self.addItem(self.image)
+        self.addItem(self.tiled_image)
         self.setSceneRect(QtCore.QRectF(0, 0, WIDTH, HEIGHT))
 
+    def add_instance(self, pos=None, instance_id=None):
+        """Add a face, sharing the index of the current model, and make
+        it current. By default it is placed beside the current model."""
+        if pos is None:
+            lo, hi = self.model.positions.min(0), self.model.positions.max(0)
+            pos = self.model.positions + (hi[0] - lo[0] + MARGIN, 0)
+        if instance_id is None:
+            instance_id = max(m.instance_id for m in self.models) + 1
+        instance = Model(self, self.model.store.like(pos), instance_id)
+        instance.set_detail(self.model.detailed)
+        self.models.append(instance)
+        self.model = instance
+        return instance
+
+    def remove_instance(self, instance=None):
+        """Remove a face, by default the current one, keeping at least
+        one."""
+        instance = instance or self.model
+        if len(self.models) == 1:
+            return
+        instance.delete_model()
+        self.models.remove(instance)
+        self.model = self.models[-1]
+
+    def load_model(self, model_dict):
+        """Load a model dictionary, with every instance it holds."""
+        while len(self.models) > 1:
+            self.remove_instance(self.models[-1])
+        self.model = self.models[0]
+        self.model.load_model(model_dict)
+        instances = model_dict.get("instances", [])
+        if instances:
+            self.model.instance_id = instances[0]["id"]
+        for instance in instances[1:]:
+            self.add_instance(self.model.store.full_pos(instance["pos"]),
+                              instance["id"])
+
+    def to_dict(self):
+        """Return a dictionary of the first model, and of every instance
+        if there are several."""
+        model_dict = self.models[0].to_dict()
+        if len(self.models) > 1:
+            model_dict["instances"] = [
+                dict(id=m.instance_id, pos=m.store.saved_pos().tolist())
+                for m in self.models]
+        return model_dict
+
+    def instance_name(self, instance):
+        """The image file name, tagged with the id of later instances."""
+        if instance is self.models[0]:
+            return self.image_fname
+        return f"{self.image_fname}#{instance.instance_id}"
+
+    def undo(self):
+        """Undo the last edit of the current model."""
+        self.model.undo()
+
+    def redo(self):
+        """Redo the last undone edit of the current model."""
+        self.model.redo()
+
+    def select_model(self):
+        """Select the current model."""
+        self.model.select_model()
+
+    def deselect_model(self):
+        """Deselect the current model."""
+        self.model.deselect_model()
+
+    def refine(self, instance=None, indices=None):
+        """Snap landmarks of a model, by default the current one, to the
+        image edges about them, in the background."""
+        instance = instance or self.model
+        contour = contour_indices(instance.store)
+        if indices is not None:
+            contour = np.intersect1d(indices, contour)
+        token = (instance, instance.store.version, self.image_fname)
+        self.refiner.request(token, contour, instance.positions[contour])
+
+    def apply_refine(self, token, indices, pos):
+        """Move to the refined positions, unless the model or image has
+        changed since they were requested."""
+        instance, version, fname = token
+        if (instance in self.models and fname == self.image_fname and
+                instance.store.version == version):
+            instance.set_points(indices, pos, "refine")
+
+    def set_detail(self, detailed):
+        """Set the level of detail of every model."""
+        for instance in self.models:
+            instance.set_detail(detailed)
+
     def print_pos(self):
-        """Print the image file name and (x, y) positions of the markers."""
-        self.model.get_positions()
-        pos = ", ".join(
-            [f"[{x:0.2f}, {y:0.2f}]" for x, y in self.model.positions])
-        print(f'"{self.image_fname:}" : [{pos}]')
-
-    def set_image(self, fname):
-        """Set the image in the scene from a filename."""
-        self.image.setPixmap(QtGui.QPixmap(fname))
-        self.setSceneRect(self.image.boundingRect())
+        """Print the image file name and (x, y) positions of the markers,
+        one line per model.
+
+        If an annotation log is open, also append them to the log."""
+        for instance in self.models:
+            name = self.instance_name(instance)
+            saved = instance.store.saved_pos()
+            pos = ", ".join([f"[{x:0.2f}, {y:0.2f}]" for x, y in saved])
+            print(f'"{name:}" : [{pos}]')
+            if self.log is not None:
+                self.log.write(name, saved)
+
+    @timed("hover")
+    def hover_item(self, pos):
+        """Return the marker, else the group, under a scene position."""
+        for instance in self.models:
+            marker = instance.marker_at(pos)
+            if marker is not None:
+                return marker
+        for item in self.items(pos):
+            if isinstance(item, LineGroup):
+                return item
+        return None
+
+    def set_hover(self, item):
+        """Move the hover highlight to item, which may be None."""
+        if item is self.hovered:
+            return
+        if self.hovered is not None:
+            self.hovered.set_hover(False)
+        self.hovered = item
+        if item is not None:
+            item.set_hover(True)
+
+    def mousePressEvent(self, event):
+        """Override super, making the clicked model current and starting
+        an undoable edit for any drag."""
+        item = self.itemAt(event.scenePos(), QtGui.QTransform())
+        for instance in self.models:
+            if instance.owns(item):
+                self.model = instance
+            instance.history.begin()
+        super(LabelerScene, self).mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        """Override super, recording what the drag moved."""
+        super(LabelerScene, self).mouseReleaseEvent(event)
+        for instance in self.models:
+            edit = instance.history.commit("drag")
+            if edit is not None:
+                PROFILER.count("drag")
+                if self.snap:
+                    self.refine(instance, edit.indices)
+
+    def mouseMoveEvent(self, event):
+        """Override super, tracking hover with the model's grid index and
+        rebuilding each dragged path once per event."""
+        if event.buttons() == QtCore.Qt.NoButton:
+            self.set_hover(self.hover_item(event.scenePos()))
+        with contextlib.ExitStack() as stack:
+            for instance in self.models:
+                stack.enter_context(instance.deferred())
+            super(LabelerScene, self).mouseMoveEvent(event)
+
+    @timed("set_image")
+    def set_image(self, fname, image=None):
+        """Set the image in the scene from a filename.
+
+        If image is given it is the already decoded QImage of fname. Images
+        over TILED_PIXELS are drawn from tiles rather than one pixmap."""
+        if image is None:
+            image = QtGui.QImage(fname)
+        self.refiner.set_image(image)
+        if image.width() * image.height() > TILED_PIXELS:
+            self.image.setPixmap(QtGui.QPixmap())
+            self.tiled_image.set_image(image)
+            self.setSceneRect(self.tiled_image.boundingRect())
+        else:
+            self.tiled_image.clear()
+            self.image.setPixmap(QtGui.QPixmap.fromImage(image))
+            self.setSceneRect(self.image.boundingRect())
         _, self.image_fname = os.path.split(fname)
 
-    def update(self):
-        """Override super"""
-        self.model.update()
-        super(LabelerScene, self).update()
+    def restyle(self):
+        """Apply a changed style, repainting the scene once."""
+        for instance in self.models:
+            instance.restyle()
+        if self.hovered is not None:
+            self.hovered.set_hover(True)
+        self.update()
 
 
 # -----------------------------------------------------------------------------
@@ -308,6 +691,8 @@ class LabelerScene(QtWidgets.QGraphicsScene):
 class LabelerView(QtWidgets.QGraphicsView):
     """The view on the model. """
     factor = 1.25
+    # Below this zoom, markers are drawn as part of their group.
+    lod_scale = 0.5
 
     def __init__(self, parent=None):
         super(LabelerView, self).__init__(parent)
@@ -321,6 +706,8 @@ class LabelerView(QtWidgets.QGraphicsView):
         self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
         self.setBackgroundBrush(QtGui.QBrush(QtGui.QColor(30, 30, 30)))
         self.setFrameShape(QtWidgets.QFrame.NoFrame)
+        self.hud = False
+        self.paints = collections.deque(maxlen=60)
         QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+="),
                             self, activated=self.zoomIn)
         QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+-"),
@@ -338,31 +725,30 @@ class LabelerView(QtWidgets.QGraphicsView):
         QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+3"),
                             self, activated=self.line_l)
 
-    def update(self):
-        """update the view"""
-        self.scene().update()
-        super(LabelerView, self).update()
+    def set_line(self, line_width):
+        """Set the line width of the scene style."""
+        self.scene().style.set_line(line_width)
+        self.scene().restyle()
+
+    def set_theme(self, theme):
+        """Set the theme of the scene style."""
+        self.scene().style.set_theme(theme)
+        self.scene().restyle()
 
     @QtCore.pyqtSlot()
     def line_s(self):
         """Line width 0.5 """
-        line_width = 0.5
-        Pen.set_line(line_width)
-        self.update()
+        self.set_line(0.5)
 
     @QtCore.pyqtSlot()
     def line_m(self):
         """Line width 1.0 """
-        line_width = 1.0
-        Pen.set_line(line_width)
-        self.update()
+        self.set_line(1.0)
 
     @QtCore.pyqtSlot()
     def line_l(self):
         """Line width 2.0 """
-        line_width = 2.0
-        Pen.set_line(line_width)
-        self.update()
+        self.set_line(2.0)
 
     @QtCore.pyqtSlot()
     def scale_up(self):
@@ -390,12 +776,56 @@ class LabelerView(QtWidgets.QGraphicsView):
         """Zoom by factor."""
         self.scale(factor, factor)
         if self.scene() is not None:
-            self.centerOn(self.scene().image)
+            self.centerOn(self.scene().sceneRect().center())
+        self.update_detail()
+
+    def update_detail(self):
+        """Set the model level of detail from the current zoom."""
+        if self.scene() is not None:
+            self.scene().set_detail(
+                self.transform().m11() >= LabelerView.lod_scale)
 
     def fitInView(self):
         """Fit to 100 %"""
         self.resetTransform()
         self.scale(1.0, 1.0)
+        self.update_detail()
+
+    def set_hud(self, hud):
+        """Show the paint time and frame rate over the view, or not."""
+        self.hud = hud
+        self.paints.clear()
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        """Override super, timing each paint for the profiler and HUD."""
+        start = time.perf_counter()
+        super(LabelerView, self).paintEvent(event)
+        stop = time.perf_counter()
+        if PROFILER.enabled:
+            PROFILER.record("paint", start, stop)
+        if self.hud:
+            self.paints.append((stop, stop - start))
+            self.draw_hud()
+
+    def draw_hud(self):
+        """Draw the last paint time and the recent frame rate."""
+        (first, _), (last, elapsed) = self.paints[0], self.paints[-1]
+        fps = (len(self.paints) - 1) / (last - first) if last > first else 0
+        text = f"paint {elapsed * 1000:5.2f} ms  {fps:5.1f} fps"
+        painter = QtGui.QPainter(self.viewport())
+        rect = painter.fontMetrics().boundingRect(text).adjusted(-4, -2, 4, 2)
+        rect.moveTopLeft(QtCore.QPoint(MARGIN, MARGIN))
+        painter.fillRect(rect, QtGui.QColor(0, 0, 0, 160))
+        painter.setPen(QtGui.QColor("white"))
+        painter.drawText(rect, QtCore.Qt.AlignCenter, text)
+        painter.end()
+
+    def leaveEvent(self, event):
+        """Override super, clearing the hover highlight."""
+        if self.scene() is not None:
+            self.scene().set_hover(None)
+        super(LabelerView, self).leaveEvent(event)
 
     def wheelEvent(self, event):
         """scroll to zoom"""
@@ -411,13 +841,47 @@ class LabelerView(QtWidgets.QGraphicsView):
 
 
 class ImageLabelerWindow(QtWidgets.QMainWindow):
-    """The main application window with menu items."""
+    """The main application window with menu items.
+
+    If a detector is named, the model is fitted to each image opened. With
+    flow, landmarks are tracked by optical flow between sequence frames.
+    With a journal, the session is autosaved every AUTOSAVE_MS."""
 
-    def __init__(self):
+    def __init__(self, detector=None, flow=False, journal=None):
         super(ImageLabelerWindow, self).__init__()
         self.scene = LabelerScene(self)
         self.viewer = LabelerView()
         self.viewer.setScene(self.scene)
+        self.cache = ImageCache(CACHE_BYTES, max_pixels=TILED_PIXELS)
+        self.io = FileIO(self.cache, parent=self)
+        self.io.model_read.connect(self.apply_model)
+        self.io.image_read.connect(self.apply_img)
+        self.io.written.connect(
+            lambda fname: self.statusBar().showMessage(f"Saved {fname}", 2000))
+        self.io.failed.connect(self.io_failed)
+        self.io.busy.connect(self.set_busy)
+        self.progress = QtWidgets.QProgressBar(maximumWidth=120)
+        self.progress.setRange(0, 0)
+        self.progress.hide()
+        self.statusBar().addPermanentWidget(self.progress)
+        self.folder = []
+        self.folder_index = 0
+        self.image_request = None
+        self.model_request = None
+        self.pending_model = None
+        self.image_path = None
+        self.image = None
+        self.sequence = None
+        self.gallery = None
+        self.flow = flow
+        self.auto_init = detector is not None
+        self.initialiser = Initialiser(detector or "centre")
+        self.initialiser.ready.connect(self.apply_init)
+        self.journal = journal
+        self.autosave_timer = QtCore.QTimer(
+            self, interval=AUTOSAVE_MS, timeout=self.autosave)
+        if journal is not None:
+            self.autosave_timer.start()
         self.setCentralWidget(self.viewer)
         self.createMenus()
         self.setWindowTitle("Face Label Tool (FLT)")
@@ -431,7 +895,8 @@ class ImageLabelerWindow(QtWidgets.QMainWindow):
             'Select all with "Ctrl A", deslect with "Ctrl D"\n' +
             '"Ctrl" click to add to selection\n' +
             'Scale model using "Alt +" and "Alt -"\n' +
-            'Set line width with "Ctrl 1", "Ctrl 2", "Ctrl 3"\n')
+            'Set line width with "Ctrl 1", "Ctrl 2", "Ctrl 3"\n' +
+            'Step through a folder or sequence with "PgDown" and "PgUp"\n')
 
         QtWidgets.QMessageBox.about(self, "Hotkeys", msg)
 
@@ -439,6 +904,22 @@ class ImageLabelerWindow(QtWidgets.QMainWindow):
         """Build the menus."""
         open_act = QtWidgets.QAction(
             "Open Image...", self, shortcut="Ctrl+O", triggered=self.open_img)
+        folder_act = QtWidgets.QAction(
+            "Open Folder...", self, shortcut="Ctrl+Shift+O",
+            triggered=self.open_dir)
+        next_act = QtWidgets.QAction(
+            "Next Image", self, shortcut="PgDown", triggered=self.next_img)
+        prev_act = QtWidgets.QAction(
+            "Previous Image", self, shortcut="PgUp", triggered=self.prev_img)
+        gallery_act = QtWidgets.QAction(
+            "Open Gallery...", self, shortcut="Ctrl+G",
+            triggered=self.open_gallery)
+        seq_act = QtWidgets.QAction(
+            "Open Sequence...", self, shortcut="Ctrl+Shift+V",
+            triggered=self.open_seq)
+        save_seq_act = QtWidgets.QAction(
+            "Save Sequence...", self, shortcut="Ctrl+Shift+S",
+            triggered=self.save_seq)
         model_act = QtWidgets.QAction(
             "Open Model...", self, shortcut="Ctrl+M", triggered=self.open_mdl)
         save_act = QtWidgets.QAction(
@@ -449,10 +930,39 @@ class ImageLabelerWindow(QtWidgets.QMainWindow):
             "Hotkeys", self, triggered=self.about)
         select_act = QtWidgets.QAction(
             "Select Model", self, shortcut="Ctrl+A",
-            triggered=self.scene.model.select_model)
+            triggered=self.scene.select_model)
         deselect_act = QtWidgets.QAction(
             "Deselect Model", self, shortcut="Ctrl+D",
-            triggered=self.scene.model.deselect_model)
+            triggered=self.scene.deselect_model)
+        undo_act = QtWidgets.QAction(
+            "Undo", self, shortcut=QtGui.QKeySequence.Undo,
+            triggered=self.scene.undo)
+        init_act = QtWidgets.QAction(
+            "Initialise Model", self, shortcut="Ctrl+I",
+            triggered=self.init_model)
+        redo_act = QtWidgets.QAction(
+            "Redo", self, shortcut=QtGui.QKeySequence.Redo,
+            triggered=self.scene.redo)
+        snap_act = QtWidgets.QAction(
+            "Snap to Edges", self, shortcut="Ctrl+E", checkable=True,
+            toggled=self.set_snap)
+        refine_act = QtWidgets.QAction(
+            "Refine Model", self, shortcut="Ctrl+R",
+            triggered=lambda: self.scene.refine())
+        add_face_act = QtWidgets.QAction(
+            "Add Face", self, shortcut="Ctrl+N",
+            triggered=lambda: self.scene.add_instance())
+        remove_face_act = QtWidgets.QAction(
+            "Remove Face", self, shortcut="Ctrl+Shift+N",
+            triggered=lambda: self.scene.remove_instance())
+        hud_act = QtWidgets.QAction(
+            "Show Frame Times", self, shortcut="F12", checkable=True,
+            toggled=self.viewer.set_hud)
+        profile_act = QtWidgets.QAction(
+            "Profile", self, checkable=True, checked=PROFILER.enabled,
+            toggled=self.set_profiling)
+        save_profile_act = QtWidgets.QAction(
+            "Save Profile...", self, triggered=self.save_profile)
         fitAct = QtWidgets.QAction(
             "View 100%", self, shortcut="Ctrl+F",
             triggered=self.viewer.fitInView)
@@ -462,6 +972,12 @@ class ImageLabelerWindow(QtWidgets.QMainWindow):
 
         self.fileMenu = QtWidgets.QMenu("File", self)
         self.fileMenu.addAction(open_act)
+        self.fileMenu.addAction(folder_act)
+        self.fileMenu.addAction(next_act)
+        self.fileMenu.addAction(prev_act)
+        self.fileMenu.addAction(gallery_act)
+        self.fileMenu.addAction(seq_act)
+        self.fileMenu.addAction(save_seq_act)
         self.fileMenu.addAction(model_act)
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(save_act)
@@ -469,12 +985,28 @@ class ImageLabelerWindow(QtWidgets.QMainWindow):
         self.fileMenu.addAction(exit_act)
 
         self.editMenu = QtWidgets.QMenu("Edit", self)
+        self.editMenu.addAction(undo_act)
+        self.editMenu.addAction(redo_act)
+        self.editMenu.addSeparator()
+        self.editMenu.addAction(init_act)
+        self.editMenu.addAction(snap_act)
+        self.editMenu.addAction(refine_act)
+        self.editMenu.addAction(add_face_act)
+        self.editMenu.addAction(remove_face_act)
         self.editMenu.addAction(select_act)
         self.editMenu.addAction(deselect_act)
 
         self.viewMenu = QtWidgets.QMenu("View", self)
         self.viewMenu.addAction(fitAct)
+        self.viewMenu.addAction(hud_act)
+        self.viewMenu.addAction(profile_act)
+        self.viewMenu.addAction(save_profile_act)
         self.viewMenu.addSeparator()
+        self.themeMenu = self.viewMenu.addMenu("Theme")
+        for theme in THEMES:
+            self.themeMenu.addAction(
+                theme.capitalize(),
+                lambda theme=theme: self.viewer.set_theme(theme))
 
         self.helpMenu = QtWidgets.QMenu("Help", self)
         self.helpMenu.addAction(about_act)
@@ -491,19 +1023,28 @@ class ImageLabelerWindow(QtWidgets.QMainWindow):
             self, "Open Model File", QtCore.QDir.currentPath())
         if not fname:
             return
-        model_in = read_json(fname)
-        self.scene.model.load_model(model_in)
+        self.io.read_model(fname)
 
     def save_mdl(self):
         """Save a model using the file dialogue."""
-        img = self.scene.image_fname.split(".")[0]
-        default_name = os.path.join(QtCore.QDir.currentPath(), f"{img}.json")
+        default_name = landmark_name(self.scene.image_fname,
+                                     QtCore.QDir.currentPath())
         fname, _ = QtWidgets.QFileDialog.getSaveFileName(
             self, "Save Model File", default_name)
         if not fname:
             return
-        model_out = self.scene.model.to_dict()
-        write_json(model_out, fname)
+        self.io.write_model(fname, self.scene.to_dict())
+
+    def set_busy(self, pending):
+        """Show the progress indicator while files are read or written."""
+        self.progress.setVisible(pending > 0)
+
+    def io_failed(self, fname, message):
+        """Report a file that could not be read or written."""
+        if fname == self.model_request:
+            self.model_request = None
+        self.statusBar().clearMessage()
+        QtWidgets.QMessageBox.information(self, "Face Label Tool", message)
 
     def open_img(self):
         """Open an image using the file dialogue."""
@@ -511,21 +1052,329 @@ class ImageLabelerWindow(QtWidgets.QMainWindow):
             self, "Open Image", QtCore.QDir.currentPath())
         if not fname:
             return
-        image = QtGui.QImage(fname)
+        self.close_seq()
+        self.folder = []
+        self.show_img(fname)
+
+    def open_dir(self):
+        """Open a folder of images to label in sequence."""
+        dname = QtWidgets.QFileDialog.getExistingDirectory(
+            self, "Open Image Folder", QtCore.QDir.currentPath())
+        if not dname:
+            return
+        self.close_seq()
+        self.folder = list_images(dname)
+        self.folder_index = 0
+        if self.folder:
+            self.show_img(self.folder[0])
+
+    def next_img(self):
+        """Show the next image of the folder."""
+        self.step_img(1)
+
+    def prev_img(self):
+        """Show the previous image of the folder."""
+        self.step_img(-1)
+
+    def step_img(self, step):
+        """Move through the folder, or sequence, by step images."""
+        if self.sequence is not None:
+            self.step_frame(step)
+            return
+        index = self.folder_index + step
+        if 0 <= index < len(self.folder):
+            self.folder_index = index
+            self.show_img(self.folder[index])
+
+    def show_img(self, fname, model=None):
+        """Show an image from the cache, or once decoded in the background.
+
+        model, a model dict or the name of a model file, is loaded once the
+        image is shown, in place of fitting the model to it. In a folder
+        session, the following images are then prefetched."""
+        self.image_request = fname
+        self.pending_model = None
+        self.model_request = None
+        if isinstance(model, dict):
+            self.pending_model = model
+        elif model is not None:
+            self.model_request = model
+            self.io.read_model(model)
+        if fname in self.cache:
+            self.apply_img(fname, self.cache.get(fname))
+        else:
+            self.statusBar().showMessage(f"Loading {fname}")
+            self.io.read_image(fname)
+
+    def apply_img(self, fname, image):
+        """Show a decoded image, unless another has been asked for since."""
+        if fname != self.image_request:
+            return
+        self.statusBar().clearMessage()
+        self.scene.set_image(fname, image)
+        self.image_path, self.image = fname, image
+        if self.pending_model is not None:
+            self.scene.load_model(self.pending_model)
+            self.pending_model = None
+        elif self.auto_init and self.model_request is None:
+            self.init_model()
+        if self.folder:
+            i = self.folder_index
+            self.cache.prefetch(self.folder[i + 1:i + 1 + PREFETCH] +
+                                self.folder[max(i - 1, 0):i])
+
+    def apply_model(self, fname, model_dict):
+        """Load a model read from a file, once its image is shown if it was
+        asked for with one."""
+        if fname != self.model_request:
+            self.scene.load_model(model_dict)
+            return
+        self.model_request = None
+        if self.image_path == self.image_request:
+            self.scene.load_model(model_dict)
+        else:
+            self.pending_model = model_dict
+
+    def open_gallery(self, dname=None, landmark_dir=None):
+        """Review a folder of images as thumbnails with their landmarks.
+
+        Landmarks are read from landmark_dir, by default the directory
+        Save Model... starts in."""
+        if not dname:
+            dname = QtWidgets.QFileDialog.getExistingDirectory(
+                self, "Open Gallery Folder", QtCore.QDir.currentPath())
+        if not dname:
+            return
+        if self.gallery is not None:
+            self.gallery.close()
+        self.gallery = GalleryView(
+            list_images(dname), landmark_dir or QtCore.QDir.currentPath())
+        self.gallery.image_activated.connect(self.show_gallery_img)
+        self.gallery.show()
+
+    def show_gallery_img(self, fname):
+        """Label an image picked in the gallery, with its saved landmarks,
+        stepping through the gallery's folder from there."""
+        self.close_seq()
+        gallery = self.gallery.model()
+        self.folder = gallery.fnames
+        self.folder_index = self.folder.index(fname)
+        saved = landmark_name(fname, gallery.landmark_dir)
+        self.show_img(fname, saved if os.path.exists(saved) else None)
+        self.raise_()
+        self.activateWindow()
+
+    def open_seq(self, path=None):
+        """Open a video, frame folder or saved sequence to label."""
+        if not path:
+            videos = " ".join(f"*{ext}" for ext in VIDEO_EXTENSIONS)
+            path, _ = QtWidgets.QFileDialog.getOpenFileName(
+                self, "Open Sequence", QtCore.QDir.currentPath(),
+                f"Sequences ({videos} *.npz);;All Files (*)")
+        if not path:
+            return
+        if self.flow and not flow_available():
+            self.flow = False
+            QtWidgets.QMessageBox.information(
+                self, "Face Label Tool", "Optical flow needs opencv-python, "
+                "landmarks will be carried forward unchanged.")
+        model = self.scene.model
+        try:
+            sequence = open_sequence(path, len(model.positions), model.index,
+                                     model.keys, self.flow)
+        except (OSError, ImportError, KeyError) as err:
+            QtWidgets.QMessageBox.information(
+                self, "Face Label Tool", f"Cannot open {path}: {err}")
+            return
+        points = sequence.track.pos.shape[1]
+        if points != len(model.positions):
+            sequence.close()
+            QtWidgets.QMessageBox.information(
+                self, "Face Label Tool", f"Cannot open {path}: it has "
+                f"{points} points, the model {len(model.positions)}.")
+            return
+        self.close_seq()
+        self.folder = []
+        self.sequence = sequence
+        if len(sequence):
+            self.show_frame(0)
+
+    def save_seq(self):
+        """Save the landmarks of every frame of the sequence."""
+        if self.sequence is None:
+            return
+        stem = os.path.splitext(os.path.basename(self.sequence.source.path))
+        default_name = os.path.join(QtCore.QDir.currentPath(),
+                                    f"{stem[0]}.npz")
+        fname, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save Sequence", default_name)
+        if not fname:
+            return
+        self.sequence.track.set(self.sequence.frame,
+                                self.scene.model.positions)
+        self.sequence.track.save(fname)
+
+    def close_seq(self):
+        """Stop labelling a sequence."""
+        if self.sequence is not None:
+            self.sequence.close()
+            self.sequence = None
+
+    def step_frame(self, step):
+        """Move through the sequence by step frames, carrying the
+        landmarks forward to frames not yet labelled."""
+        index = self.sequence.frame + step
+        if 0 <= index < len(self.sequence):
+            pos = self.sequence.step(index, self.scene.model.positions)
+            self.show_frame(index, pos)
+
+    def show_frame(self, index, pos=None):
+        """Show a frame of the sequence, with its landmarks if labelled."""
+        image = self.sequence.image(index)
+        name = self.sequence.name(index)
         if image.isNull():
             QtWidgets.QMessageBox.information(
-                self, "Face Label Tool", "Cannot load %s." % fname)
+                self, "Face Label Tool", f"Cannot load {name}.")
+            return
+        self.scene.set_image(name, image)
+        self.image_path, self.image = name, image
+        if pos is None and self.sequence.track.labelled(index):
+            pos = self.sequence.track.pos[index]
+        if pos is not None:
+            self.scene.model.set_positions(pos)
+
+    def init_model(self):
+        """Fit the model to the face detected in the image."""
+        if self.image is not None:
+            self.initialiser.request(self.image_path, self.image,
+                                     self.scene.model.positions)
+
+    def apply_init(self, fname, pos):
+        """Move the model to the fitted positions, if still current."""
+        if fname == self.image_path:
+            self.scene.model.set_positions(pos)
+
+    def autosave(self):
+        """Journal the landmarks moved since the last autosave, or the
+        track of a sequence, which is journalled whole."""
+        if self.image_path is None:
             return
-        self.scene.set_image(fname)
+        if self.sequence is not None:
+            frame = self.sequence.frame
+            self.sequence.track.set(frame, self.scene.model.positions)
+            self.journal.update_track(self.sequence.track, frame)
+            return
+        self.journal.update(self.image_path,
+                            [m.positions for m in self.scene.models],
+                            self.scene.to_dict)
+
+    def restore_session(self):
+        """Show the autosaved image and model, or sequence, of the last
+        session."""
+        track = self.journal.restore_track()
+        if track is not None:
+            fname, frame = track
+            self.open_seq(fname)
+            if self.sequence is not None and 0 < frame < len(self.sequence):
+                self.sequence.frame = frame
+                self.show_frame(frame)
+            return
+        state = self.journal.restore()
+        if state is None:
+            return
+        image, model_dict = state
+        if os.path.exists(image):
+            self.show_img(image, model_dict)
+        else:
+            self.scene.load_model(model_dict)
+
+    def set_profiling(self, enabled):
+        """Start or stop recording the timers and counters."""
+        PROFILER.enabled = enabled
+
+    def save_profile(self):
+        """Save the profile as a summary, or as a Chrome trace."""
+        default_name = os.path.join(QtCore.QDir.currentPath(),
+                                    "profile.json")
+        fname, kind = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save Profile", default_name,
+            "Summary (*.json);;Chrome Trace (*.json)")
+        if fname:
+            PROFILER.save(fname, trace=kind.startswith("Chrome"))
+
+    def set_snap(self, snap):
+        """Snap dragged landmarks to the image edges, or not."""
+        self.scene.snap = snap
+
+    def closeEvent(self, event):
+        """Override super."""
+        if self.journal is not None:
+            self.autosave_timer.stop()
+            self.autosave()
+            self.journal.close()
+        self.io.shutdown()
+        if self.gallery is not None:
+            self.gallery.close()
+        self.initialiser.shutdown()
+        self.scene.refiner.shutdown()
+        self.close_seq()
+        self.cache.shutdown()
+        self.scene.tiled_image.shutdown()
+        if self.scene.log is not None:
+            self.scene.log.close()
+        super(ImageLabelerWindow, self).closeEvent(event)
 
 
 def main():
     """Run the application."""
-    app = QtWidgets.QApplication(["Face Label Tool"] + sys.argv[1:])
-    path = resource_filename(__name__, "data/icon.png")
-    app.setWindowIcon(QtGui.QIcon(path))
-    _ = ImageLabelerWindow()
-    sys.exit(app.exec_())
+    parser = argparse.ArgumentParser(prog="flt")
+    parser.add_argument("--log", help="append printed positions to this "
+                        "annotation log")
+    parser.add_argument("--init", choices=sorted(DETECTORS),
+                        help="fit the model to each image opened with this "
+                        "face detector")
+    parser.add_argument("--sequence", help="label a video, a folder of "
+                        "frames or a saved sequence .npz")
+    parser.add_argument("--flow", action="store_true",
+                        help="track landmarks between sequence frames by "
+                        "optical flow, needs opencv-python")
+    parser.add_argument("--profile", help="time the hot paths and write a "
+                        "json summary here on exit")
+    parser.add_argument("--trace", help="time the hot paths and write a "
+                        "Chrome trace here on exit")
+    parser.add_argument("--gallery", help="review a folder of images as "
+                        "thumbnails")
+    parser.add_argument("--landmarks", help="saved landmarks shown in the "
+                        "gallery, default is the current directory")
+    parser.add_argument("--new", action="store_true",
+                        help="start a new session, rather than restoring "
+                        "the last one")
+    parser.add_argument("--no-autosave", action="store_true",
+                        help="do not journal the session")
+    args, qt_args = parser.parse_known_args()
+    if args.flow and not flow_available():
+        parser.error("--flow needs opencv-python")
+    if args.init and not detector_available(args.init):
+        parser.error(f"--init {args.init} needs opencv-python")
+    PROFILER.enabled = bool(args.profile or args.trace)
+    app = QtWidgets.QApplication(["Face Label Tool"] + qt_args)
+    app.setWindowIcon(QtGui.QIcon(ICON))
+    journal = None if args.no_autosave else Journal()
+    window = ImageLabelerWindow(args.init, args.flow, journal)
+    if journal is not None and not args.new:
+        window.restore_session()
+    if args.log:
+        window.scene.log = AnnotationLog(args.log)
+    if args.sequence:
+        window.open_seq(args.sequence)
+    if args.gallery:
+        window.open_gallery(args.gallery, args.landmarks)
+    status = app.exec_()
+    if args.profile:
+        PROFILER.save(args.profile)
+    if args.trace:
+        PROFILER.save(args.trace, trace=True)
+    sys.exit(status)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,226 @@
+"""A scrolling grid of image thumbnails with their saved landmarks.
+
+Only the cells in view are asked for, and thumbnails are decoded at their
+display size, then kept in an on disk cache keyed by each image's path,
+mtime and the thumbnail size, so reviewing a folder again decodes nothing.
+"""
+import collections
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from .batch import landmark_name
+from .model import read_json
+from .style import Style
+
+THUMB_DIR = os.environ.get(
+    "FLT_THUMBS", os.path.join(os.path.expanduser("~"), ".flt", "thumbs"))
+THUMB_SIZE = 160
+# Thumbnails held in memory, a few screens' worth.
+MAX_THUMBS = 2000
+ThumbRole = QtCore.Qt.UserRole + 1
+
+
+def thumbnail_fname(fname, size, cache_dir=THUMB_DIR):
+    """Return the cache file of an image's thumbnail, keyed by mtime."""
+    stat = os.stat(fname)
+    key = f"{os.path.abspath(fname)}|{stat.st_mtime_ns}|{size}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() +
+                        ".png")
+
+
+def make_thumbnail(fname, size=THUMB_SIZE, cache_dir=THUMB_DIR):
+    """Return the thumbnail of an image and the image (width, height).
+
+    The thumbnail is read from the cache, else decoded straight to its
+    size, which for jpeg skips most of the full decode, and cached. A
+    cached thumbnail without its image size is made again."""
+    cached = thumbnail_fname(fname, size, cache_dir)
+    thumb = QtGui.QImage(cached)
+    if not thumb.isNull():
+        try:
+            width, height = map(int, thumb.text("size").split("x"))
+            return thumb, (width, height)
+        except ValueError:
+            pass
+    reader = QtGui.QImageReader(fname)
+    full = reader.size()
+    if full.isValid():
+        reader.setScaledSize(full.scaled(size, size,
+                                         QtCore.Qt.KeepAspectRatio))
+    thumb = reader.read()
+    if thumb.isNull():
+        return thumb, (0, 0)
+    if not full.isValid():
+        full = thumb.size()
+        thumb = thumb.scaled(size, size, QtCore.Qt.KeepAspectRatio,
+                             QtCore.Qt.SmoothTransformation)
+    thumb.setText("size", f"{full.width()}x{full.height()}")
+    os.makedirs(cache_dir, exist_ok=True)
+    thumb.save(cached + ".tmp", "png")
+    os.replace(cached + ".tmp", cached)
+    return thumb, (full.width(), full.height())
+
+
+class Thumb:
+    """A thumbnail, the size of its image and its saved landmarks."""
+
+    def __init__(self, image, size, pos=None):
+        self.image = image
+        self.size = size
+        self.pos = pos
+
+
+class GalleryModel(QtCore.QAbstractListModel):
+    """The images of a folder, with thumbnails made on request on a pool.
+
+    The newest request is served first, so cells scrolled past wait for
+    those now in view. Landmarks are read from landmark_dir, named as
+    Save Model... names them."""
+    thumb_ready = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, fnames, landmark_dir=None, size=THUMB_SIZE,
+                 workers=4, parent=None):
+        super(GalleryModel, self).__init__(parent)
+        self.fnames = list(fnames)
+        self.landmark_dir = landmark_dir
+        self.size = size
+        self._thumbs = collections.OrderedDict()
+        self._requested = set()
+        self._stack = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self.thumb_ready.connect(self.add_thumb)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.fnames)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Override super, requesting thumbnails as the view asks."""
+        row = index.row()
+        if role == QtCore.Qt.DisplayRole:
+            return os.path.basename(self.fnames[row])
+        if role == QtCore.Qt.ToolTipRole:
+            return self.fnames[row]
+        if role == ThumbRole:
+            if row in self._thumbs:
+                self._thumbs.move_to_end(row)
+                return self._thumbs[row]
+            self.request(row)
+        return None
+
+    def request(self, row):
+        """Make a thumbnail on the pool, unless already asked for."""
+        if row not in self._requested:
+            self._requested.add(row)
+            with self._lock:
+                self._stack.append(row)
+            self._pool.submit(self._load_next)
+
+    def add_thumb(self, row, thumb):
+        """Keep a finished thumbnail and redraw its cell.
+
+        thumb is None if it could not be made, so it is asked for again
+        when the cell is next drawn."""
+        self._requested.discard(row)
+        if thumb is None:
+            return
+        self._thumbs[row] = thumb
+        while len(self._thumbs) > MAX_THUMBS:
+            self._thumbs.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [ThumbRole])
+
+    def shutdown(self):
+        """Stop the workers, dropping queued thumbnails."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _load_next(self):
+        """Worker: make the newest requested thumbnail and read its
+        landmarks."""
+        with self._lock:
+            row = self._stack.pop()
+        fname = self.fnames[row]
+        try:
+            image, size = make_thumbnail(fname, self.size)
+        except (OSError, ValueError, KeyError):
+            self.thumb_ready.emit(row, None)
+            return
+        pos = None
+        if self.landmark_dir:
+            try:
+                pos = np.asarray(read_json(landmark_name(
+                    fname, self.landmark_dir))["pos"], dtype=float)
+            except (OSError, ValueError, KeyError):
+                pass
+        self.thumb_ready.emit(row, Thumb(image, size, pos))
+
+
+class GalleryDelegate(QtWidgets.QStyledItemDelegate):
+    """Draw a cell's thumbnail, its landmarks and its file name."""
+
+    def __init__(self, size=THUMB_SIZE, style=None, parent=None):
+        super(GalleryDelegate, self).__init__(parent)
+        self.size = size
+        self.style = style or Style()
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(self.size + 8,
+                            self.size + 8 + option.fontMetrics.height())
+
+    def paint(self, painter, option, index):
+        """Override super."""
+        rect = option.rect.adjusted(4, 4, -4, -4)
+        if option.state & QtWidgets.QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        thumb = index.data(ThumbRole)
+        if thumb is not None and not thumb.image.isNull():
+            image = thumb.image
+            x = rect.x() + (self.size - image.width()) // 2
+            y = rect.y() + (self.size - image.height()) // 2
+            painter.drawImage(x, y, image)
+            if thumb.pos is not None and thumb.size[0]:
+                scale = image.width() / thumb.size[0]
+                points = [QtCore.QPointF(x + px * scale, y + py * scale)
+                          for px, py in thumb.pos]
+                painter.setPen(self.style.line_pen)
+                painter.drawPoints(QtGui.QPolygonF(points))
+        painter.setPen(option.palette.color(QtGui.QPalette.Text))
+        text = QtCore.QRect(rect.x(), rect.y() + self.size, rect.width(),
+                            option.fontMetrics.height())
+        name = option.fontMetrics.elidedText(
+            index.data(), QtCore.Qt.ElideMiddle, rect.width())
+        painter.drawText(text, QtCore.Qt.AlignCenter, name)
+
+
+class GalleryView(QtWidgets.QListView):
+    """A grid of thumbnails; activating one emits its file name.
+
+    With uniform item sizes the view lays out thousands of cells without
+    asking for their data, and only the cells in view are drawn."""
+    image_activated = QtCore.pyqtSignal(str)
+
+    def __init__(self, fnames, landmark_dir=None, size=THUMB_SIZE,
+                 parent=None):
+        super(GalleryView, self).__init__(parent)
+        self.setViewMode(QtWidgets.QListView.IconMode)
+        self.setResizeMode(QtWidgets.QListView.Adjust)
+        self.setMovement(QtWidgets.QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.setModel(GalleryModel(fnames, landmark_dir, size, parent=self))
+        self.setItemDelegate(GalleryDelegate(size, parent=self))
+        self.activated.connect(
+            lambda index: self.image_activated.emit(
+                self.model().fnames[index.row()]))
+        self.setWindowTitle("Gallery")
+        self.resize(6 * (size + 8) + 24, 4 * (size + 28))
+
+    def closeEvent(self, event):
+        """Override super."""
+        self.model().shutdown()
+        super(GalleryView, self).closeEvent(event)
@@ -0,0 +1,84 @@
+"""Undo and redo of landmark edits, recorded as position deltas."""
+import collections
+
+import numpy as np
+
+
+class Edit:
+    """The indices an edit moved and the (x, y) delta of each."""
+
+    def __init__(self, indices, delta, label=""):
+        self.indices = indices
+        self.delta = delta
+        self.label = label
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.delta.nbytes
+
+
+class History:
+    """Bounded undo and redo stacks over a LandmarkStore.
+
+    Edits are bracketed by begin() and commit(); only the points that
+    moved are recorded. The oldest edits are dropped once the undo stack
+    holds more than max_bytes.
+    """
+
+    def __init__(self, store, max_bytes=8 * 2**20):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.undo_stack = collections.deque()
+        self.redo_stack = []
+        self._before = None
+        self._depth = 0
+
+    def begin(self):
+        """Start an edit, nested edits are merged into the outermost."""
+        if not self._depth:
+            self._before = self.store.pos.copy()
+        self._depth += 1
+
+    def commit(self, label=""):
+        """End an edit, recording it if any point moved.
+
+        Return the recorded Edit, or None."""
+        self._depth = max(self._depth - 1, 0)
+        if self._depth or self._before is None:
+            return None
+        moved = self.store.pos - self._before
+        self._before = None
+        indices = np.flatnonzero(np.any(moved != 0, axis=1))
+        if not len(indices):
+            return None
+        edit = Edit(indices, moved[indices], label)
+        self.push(edit)
+        self.redo_stack.clear()
+        return edit
+
+    def push(self, edit):
+        """Add an edit to the undo stack, dropping old edits over budget."""
+        self.undo_stack.append(edit)
+        self.nbytes += edit.nbytes
+        while self.nbytes > self.max_bytes and len(self.undo_stack) > 1:
+            self.nbytes -= self.undo_stack.popleft().nbytes
+
+    def undo(self):
+        """Revert the last edit, return the indices it moved, or None."""
+        if not self.undo_stack:
+            return None
+        edit = self.undo_stack.pop()
+        self.nbytes -= edit.nbytes
+        self.store.move(edit.indices, -edit.delta)
+        self.redo_stack.append(edit)
+        return edit.indices
+
+    def redo(self):
+        """Reapply the last undone edit, return the indices it moved."""
+        if not self.redo_stack:
+            return None
+        edit = self.redo_stack.pop()
+        self.store.move(edit.indices, edit.delta)
+        self.push(edit)
+        return edit.indices
@@ -0,0 +1,64 @@
+"""Read image dimensions from file headers, without decoding or Qt."""
+import os
+import struct
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
+
+# JPEG start of frame markers, the ones that hold the image size.
+_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+        0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def is_image(fname):
+    """Return True if fname has a known image extension."""
+    return os.path.splitext(fname)[1].lower() in IMAGE_EXTENSIONS
+
+
+def list_images(dname):
+    """Return the sorted image file names in a directory."""
+    return sorted(os.path.join(dname, f) for f in os.listdir(dname)
+                  if is_image(f))
+
+
+def image_size(fname):
+    """Return the (width, height) of a png, jpeg, gif or bmp image."""
+    with open(fname, "rb") as fid:
+        head = fid.read(26)
+        if head[:8] == b"\x89PNG\r\n\x1a\n":
+            return _unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return _unpack("<HH", head[6:10])
+        if head[:2] == b"BM":
+            width, height = _unpack("<ii", head[18:26])
+            return width, abs(height)
+        if head[:2] == b"\xff\xd8":
+            fid.seek(2)
+            return _jpeg_size(fid)
+    raise ValueError(f"Unknown image format: {fname}")
+
+
+def _unpack(fmt, data):
+    """Unpack a header field, raising ValueError if the file ends first."""
+    if len(data) < struct.calcsize(fmt):
+        raise ValueError("truncated header")
+    return struct.unpack(fmt, data)
+
+
+def _jpeg_size(fid):
+    """Walk the jpeg markers to the first start of frame."""
+    while True:
+        byte = fid.read(1)
+        while byte and byte != b"\xff":
+            byte = fid.read(1)
+        while byte == b"\xff":
+            byte = fid.read(1)
+        if not byte:
+            raise ValueError("No jpeg start of frame found.")
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            continue
+        length, = _unpack(">H", fid.read(2))
+        if marker in _SOF:
+            height, width = _unpack(">xHH", fid.read(5))
+            return width, height
+        fid.seek(length - 2, os.SEEK_CUR)
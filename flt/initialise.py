@@ -0,0 +1,71 @@
+"""Run a face detector on a worker thread to place the model on an image."""
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt5 import QtCore, QtGui
+
+from .detect import get_detector, initialise
+
+
+def gray_view(gray):
+    """Return a (height, width) uint8 view of a Format_Grayscale8 QImage.
+
+    No pixels are copied; the view is only valid while gray is alive."""
+    ptr = gray.constBits()
+    ptr.setsize(gray.bytesPerLine() * gray.height())
+    arr = np.frombuffer(ptr, np.uint8).reshape(
+        gray.height(), gray.bytesPerLine())
+    return arr[:, :gray.width()]
+
+
+def gray_array(image):
+    """Return a QImage as a (height, width) uint8 grayscale array."""
+    gray = image.convertToFormat(QtGui.QImage.Format_Grayscale8)
+    return gray_view(gray).copy()
+
+
+class Initialiser(QtCore.QObject):
+    """Fit the model to detected faces off the GUI thread.
+
+    Results are cached per image file name and starting positions, so
+    revisiting an image does not run the detector again, while a model
+    loaded since is fitted afresh. ready is emitted with the file name
+    and the fitted (N, 2) positions.
+    """
+    ready = QtCore.pyqtSignal(str, object)
+
+    def __init__(self, detector="centre", max_cached=1024, parent=None):
+        super(Initialiser, self).__init__(parent)
+        self.max_cached = max_cached
+        self._detector = get_detector(detector)
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+    def request(self, fname, image, pos):
+        """Fit pos to the face in image, emitting ready when done."""
+        pos = np.array(pos, dtype=np.float64)
+        key = (fname, pos.shape, pos.tobytes())
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.ready.emit(fname, self._cache[key])
+                return
+        self._pool.submit(self._run, key, image, pos)
+
+    def shutdown(self):
+        """Stop the worker thread, dropping queued requests."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, key, image, pos):
+        """Worker: detect and fit, caching the result."""
+        fitted = initialise(gray_array(image), pos, self._detector)
+        if fitted is None:
+            return
+        with self._lock:
+            self._cache[key] = fitted
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        self.ready.emit(key[0], fitted)
@@ -0,0 +1,214 @@
+"""Autosave the labelling session, to restore it after a crash.
+
+The journal directory holds a snapshot, ``{"image": ..., "model": ...,
+"journal": ...}``, and the named journal, one json line for each autosave
+since, of only the points that moved: ``{"face": 0, "idx": [...], "pos":
+[[x, y], ...]}``. Every compact_every lines, or when the image or model
+changes, a new snapshot starts a new journal and the old one is removed.
+A sequence is journalled whole: its track is saved as TRACK, beside a
+snapshot naming the frame shown, ``{"image": ..., "sequence": ...,
+"frame": ...}``, each time it changes.
+Files are written in order on one worker thread; a line torn by a crash
+is ignored when restoring.
+
+Each running session locks a numbered slot directory of JOURNAL_DIR, the
+first not locked by another, so two windows never write over each other's
+journal; a crashed session's lock is released with its process, and the
+next session started takes over its slot.
+"""
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from .model import read_json, write_json_atomic
+from .sequence import Track
+from .store import full_positions, saved_positions
+
+JOURNAL_DIR = os.environ.get(
+    "FLT_JOURNAL", os.path.join(os.path.expanduser("~"), ".flt", "session"))
+SNAPSHOT = "snapshot.json"
+TRACK = "track.npz"
+LOCK = "lock"
+
+
+class Journal:
+    """Snapshots and position changes of a session, in a slot of a
+    directory."""
+
+    def __init__(self, dname=JOURNAL_DIR, compact_every=100):
+        self.dname, self._lock = _claim_slot(dname)
+        self.compact_every = compact_every
+        self.image = None
+        self.positions = []
+        self.entries = 0
+        self.journal = None
+        self.frame = None
+        self._generation = 0
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def snapshot_fname(self):
+        return os.path.join(self.dname, SNAPSHOT)
+
+    def update(self, image, positions, model_dict):
+        """Journal what moved since the last update.
+
+        positions is a list of the (N, 2) positions of each face, and
+        model_dict a callable returning the full model dict, only called
+        when a snapshot is due."""
+        same = image == self.image and len(positions) == len(self.positions)
+        if not same or any(new.shape != old.shape
+                           for new, old in zip(positions, self.positions)):
+            self.snapshot(image, positions, model_dict())
+            return
+        records = []
+        for face, (new, old) in enumerate(zip(positions, self.positions)):
+            moved = np.flatnonzero(np.any(new != old, axis=1))
+            if len(moved):
+                records.append(dict(face=face, idx=moved.tolist(),
+                                    pos=new[moved].tolist()))
+        if not records:
+            return
+        if self.entries + 1 >= self.compact_every:
+            self.snapshot(image, positions, model_dict())
+            return
+        self.entries += 1
+        self.positions = [np.array(p) for p in positions]
+        lines = "".join(json.dumps(r) + "\n" for r in records)
+        self._pool.submit(self._append, self.journal, lines)
+
+    def update_track(self, track, frame):
+        """Save the track of a sequence, if it or the frame shown changed
+        since the last update."""
+        if (track.source == self.image and frame == self.frame and
+                len(self.positions) == 1 and
+                self.positions[0].shape == track.pos.shape and
+                np.array_equal(self.positions[0], track.pos, equal_nan=True)):
+            return
+        self.image = track.source
+        self.positions = [track.pos.copy()]
+        self.frame = frame
+        self.entries = 0
+        self.journal = None
+        copy = Track(len(track), track.pos.shape[1], track.index, track.keys,
+                     self.positions[0].copy(), track.source)
+        self._pool.submit(self._save_track, copy, dict(
+            image=track.source, sequence=TRACK, frame=frame, journal=None))
+
+    def snapshot(self, image, positions, model_dict):
+        """Replace the journal with a snapshot of the image and model."""
+        self.image = image
+        self.frame = None
+        self.positions = [np.array(p) for p in positions]
+        self.entries = 0
+        self._generation += 1
+        self.journal = f"journal-{os.getpid()}-{self._generation}.jsonl"
+        self._pool.submit(self._snapshot, dict(image=image, model=model_dict,
+                                               journal=self.journal))
+
+    def restore(self):
+        """Return the journalled (image, model dict), or None."""
+        try:
+            state = read_json(self.snapshot_fname)
+        except (OSError, ValueError):
+            return None
+        if "model" not in state:
+            return None
+        model_dict = state["model"]
+        index, keys = model_dict["index"], model_dict["keys"]
+        instances = model_dict.get("instances") or [model_dict]
+        # Records index every point, the model is saved with the drawn ones.
+        faces = [full_positions(f["pos"], index, keys) for f in instances]
+        fname = os.path.join(self.dname, state["journal"])
+        for record in read_journal(fname):
+            faces[record["face"]][record["idx"]] = record["pos"]
+        for instance, pos in zip(instances, faces):
+            instance["pos"] = saved_positions(pos, index, keys).tolist()
+        model_dict["pos"] = instances[0]["pos"]
+        return state["image"], model_dict
+
+    def restore_track(self):
+        """Return the journalled (track file name, frame) of a sequence, or
+        None."""
+        try:
+            state = read_json(self.snapshot_fname)
+        except (OSError, ValueError):
+            return None
+        if "sequence" not in state:
+            return None
+        fname = os.path.join(self.dname, state["sequence"])
+        if not os.path.exists(fname):
+            return None
+        return fname, state["frame"]
+
+    def close(self):
+        """Finish writing and release the slot."""
+        self._pool.shutdown(wait=True)
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def _append(self, journal, lines):
+        """Worker: append lines to a journal and sync them to disk."""
+        with open(os.path.join(self.dname, journal), "a") as fid:
+            fid.write(lines)
+            fid.flush()
+            os.fsync(fid.fileno())
+
+    def _snapshot(self, state):
+        """Worker: write a snapshot, then remove the journals before it."""
+        write_json_atomic(state, self.snapshot_fname)
+        for fname in os.listdir(self.dname):
+            if fname.startswith("journal-") and fname != state["journal"]:
+                os.remove(os.path.join(self.dname, fname))
+
+    def _save_track(self, track, state):
+        """Worker: replace the journalled track, then snapshot its frame."""
+        fname = os.path.join(self.dname, TRACK)
+        with open(f"{fname}.tmp", "wb") as fid:
+            track.save(fid)
+            fid.flush()
+            os.fsync(fid.fileno())
+        os.replace(f"{fname}.tmp", fname)
+        self._snapshot(state)
+
+
+def _claim_slot(dname):
+    """Return the first slot directory of dname that no other session has
+    locked, and its lock file, held open until the session closes."""
+    for slot in itertools.count():
+        slot_dname = os.path.join(dname, str(slot))
+        os.makedirs(slot_dname, exist_ok=True)
+        fid = open(os.path.join(slot_dname, LOCK), "a")
+        try:
+            if fcntl is not None:
+                fcntl.flock(fid.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fid.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fid.close()
+            continue
+        return slot_dname, fid
+
+
+def read_journal(fname):
+    """Yield the records of a journal, stopping at a torn line."""
+    try:
+        fid = open(fname)
+    except OSError:
+        return
+    with fid:
+        for line in fid:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
@@ -1,5 +1,6 @@
 """construct landmark models """
 import json
+import os
 
 
 def read_json(fname):
@@ -13,6 +14,15 @@ def write_json(model, fname):
         json.dump(model, fid)
 
 
+def write_json_atomic(model_dict, fname):
+    """Write json to a temporary file and rename it over fname, so a
+    reader never sees a partly written file."""
+    tmp = f"{fname}.tmp"
+    with open(tmp, "w") as fid:
+        json.dump(model_dict, fid)
+    os.replace(tmp, fname)
+
+
 index = dict(
     jaw=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
     left_brow=[17, 18, 19, 20, 21],
@@ -0,0 +1,96 @@
+"""Background image decoding into a memory bounded LRU cache."""
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtGui
+
+from .imageinfo import image_size
+from .timing import PROFILER, timed
+
+
+class ImageCache:
+    """Decoded QImages, least recently used first out over max_bytes.
+
+    QImage, unlike QPixmap, is safe to decode off the GUI thread, so images
+    are prefetched on worker threads and converted to a pixmap once shown.
+    Images of over max_pixels are neither prefetched nor kept, so a very
+    large image is only held while it is shown.
+    """
+
+    def __init__(self, max_bytes=512 * 2**20, workers=1, max_pixels=None):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.nbytes = 0
+        self._images = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def __contains__(self, fname):
+        with self._lock:
+            return fname in self._images
+
+    def get(self, fname):
+        """Return the decoded image, waiting on or doing the decode."""
+        with self._lock:
+            if fname in self._images:
+                PROFILER.count("cache_hit")
+                self._images.move_to_end(fname)
+                return self._images[fname]
+            future = self._pending.get(fname)
+        PROFILER.count("cache_miss")
+        if future is not None:
+            return future.result()
+        return self._load(fname)
+
+    def prefetch(self, fnames):
+        """Decode images on the worker thread, in order."""
+        fnames = [f for f in fnames if self._cacheable(f)]
+        with self._lock:
+            for fname in fnames:
+                if fname not in self._images and fname not in self._pending:
+                    self._pending[fname] = self._pool.submit(
+                        self._load, fname)
+
+    def clear(self):
+        """Drop every cached image."""
+        with self._lock:
+            self._images.clear()
+            self.nbytes = 0
+
+    def shutdown(self):
+        """Stop the worker threads, dropping queued work."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _cacheable(self, fname):
+        """Return False if an image's header says it is over max_pixels."""
+        if self.max_pixels is None:
+            return True
+        try:
+            width, height = image_size(fname)
+        except (OSError, ValueError):
+            return True
+        return width * height <= self.max_pixels
+
+    def _decode(self, fname):
+        """Decode an image, overridden for other image sources."""
+        return QtGui.QImage(fname)
+
+    @timed("decode")
+    def _load(self, fname):
+        """Decode an image and cache it, a null image is not cached."""
+        image = self._decode(fname)
+        with self._lock:
+            self._pending.pop(fname, None)
+            if image.isNull() or fname in self._images:
+                return self._images.get(fname, image)
+            if (self.max_pixels is not None and
+                    image.width() * image.height() > self.max_pixels):
+                return image
+            self._images[fname] = image
+            self.nbytes += image.sizeInBytes()
+            while self.nbytes > self.max_bytes and len(self._images) > 1:
+                _, old = self._images.popitem(last=False)
+                self.nbytes -= old.sizeInBytes()
+        return image
@@ -0,0 +1,126 @@
+"""Snap landmarks to nearby image edges, to sub-pixel accuracy."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt5 import QtCore, QtGui
+
+from .initialise import gray_view
+
+
+def contour_indices(store):
+    """Return the indices of every group of more than one point.
+
+    Single point groups, the pupils, mark blobs rather than edges."""
+    groups = [store.index[key] for key in store.keys
+              if len(store.index[key]) > 1]
+    if not groups:
+        return np.zeros(0, dtype=np.intp)
+    return np.unique(np.concatenate(groups))
+
+
+def _peak_offset(left, centre, right):
+    """Return the sub-pixel offset of a peak from three samples."""
+    denom = left - 2 * centre + right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.where(denom < 0, 0.5 * (left - right) / denom, 0)
+    return np.clip(offset, -0.5, 0.5)
+
+
+def refine_points(gray, pos, radius=3, sigma=None, min_strength=8.0):
+    """Move (M, 2) positions to the strongest edge in a window about each.
+
+    The gradient magnitude of a (2 * radius + 1) square window is sampled
+    about every point at once, weighted by a gaussian of sigma (by default
+    radius) so nearer edges win, and the peak is refined by a parabola
+    through its neighbours. Points outside the (H, W) uint8 image, or
+    without an edge stronger than min_strength grey levels, are kept."""
+    pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+    height, width = gray.shape
+    sigma = radius if sigma is None else sigma
+    offsets = np.arange(-radius - 1, radius + 2)
+    centre = np.rint(pos).astype(np.intp)
+    xs = np.clip(centre[:, 0, None] + offsets, 0, width - 1)
+    ys = np.clip(centre[:, 1, None] + offsets, 0, height - 1)
+    patch = gray[ys[:, :, None], xs[:, None, :]].astype(np.float32)
+
+    gx = patch[:, 1:-1, 2:] - patch[:, 1:-1, :-2]
+    gy = patch[:, 2:, 1:-1] - patch[:, :-2, 1:-1]
+    magnitude = 0.5 * np.hypot(gx, gy)
+    inner = offsets[1:-1]
+    weight = np.exp(-(inner[:, None]**2 + inner[None, :]**2) /
+                    (2.0 * sigma**2))
+    score = magnitude * weight
+
+    size = len(inner)
+    flat = score.reshape(len(pos), -1)
+    peak = flat.argmax(axis=1)
+    iy, ix = np.divmod(peak, size)
+    rows = np.arange(len(pos))
+    left = score[rows, iy, np.maximum(ix - 1, 0)]
+    right = score[rows, iy, np.minimum(ix + 1, size - 1)]
+    above = score[rows, np.maximum(iy - 1, 0), ix]
+    below = score[rows, np.minimum(iy + 1, size - 1), ix]
+    peak_score = flat[rows, peak]
+    dx = np.where((ix > 0) & (ix < size - 1),
+                  _peak_offset(left, peak_score, right), 0)
+    dy = np.where((iy > 0) & (iy < size - 1),
+                  _peak_offset(above, peak_score, below), 0)
+
+    refined = np.stack([centre[:, 0] + inner[ix] + dx,
+                        centre[:, 1] + inner[iy] + dy], axis=1)
+    inside = ((pos >= 0) & (pos < (width, height))).all(axis=1)
+    strong = magnitude[rows, iy, ix] >= min_strength
+    return np.where((inside & strong)[:, None], refined, pos)
+
+
+class Refiner(QtCore.QObject):
+    """Refine landmark positions against the current image off the GUI
+    thread.
+
+    The image is converted to grayscale once, on the worker, and then read
+    in place without copying. ready is emitted with the token, indices and
+    refined positions of each request.
+    """
+    ready = QtCore.pyqtSignal(object, object, object)
+
+    def __init__(self, radius=3, parent=None):
+        super(Refiner, self).__init__(parent)
+        self.radius = radius
+        self._image = None
+        self._gray = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+    def set_image(self, image):
+        """Set the QImage refined against, or None."""
+        with self._lock:
+            self._image, self._gray = image, None
+
+    def request(self, token, indices, pos):
+        """Refine the positions at indices, emitting ready when done."""
+        self._pool.submit(self._run, token, np.array(indices),
+                          np.array(pos, dtype=float))
+
+    def shutdown(self):
+        """Stop the worker thread, dropping queued requests."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _gray_image(self):
+        """Worker: return the grayscale image, converting it once."""
+        with self._lock:
+            image, gray = self._image, self._gray
+        if gray is None and image is not None:
+            gray = image.convertToFormat(QtGui.QImage.Format_Grayscale8)
+            with self._lock:
+                if self._image is image:
+                    self._gray = gray
+        return gray
+
+    def _run(self, token, indices, pos):
+        """Worker: refine and emit."""
+        gray = self._gray_image()
+        if gray is None or gray.isNull() or not len(indices):
+            return
+        refined = refine_points(gray_view(gray), pos, self.radius)
+        self.ready.emit(token, indices, refined)
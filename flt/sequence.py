@@ -0,0 +1,236 @@
+"""Label video and image sequences, carrying landmarks from frame to frame.
+
+Frames are decoded ahead of the one shown on a background thread, and the
+landmarks of a whole sequence are kept in one (frames, N, 2) array, saved
+as a single .npz file.
+"""
+import importlib.util
+import json
+import os
+import threading
+
+import numpy as np
+from PyQt5 import QtGui
+
+from .imageinfo import list_images
+from .initialise import gray_array
+from .prefetch import ImageCache
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+class FrameDirectory:
+    """The sorted images of a directory, as frames."""
+
+    def __init__(self, dname):
+        self.path = dname
+        self.fnames = list_images(dname)
+
+    def __len__(self):
+        return len(self.fnames)
+
+    def name(self, i):
+        """Return the file name of a frame."""
+        return self.fnames[i]
+
+    def read(self, i):
+        """Decode a frame."""
+        return QtGui.QImage(self.fnames[i])
+
+    def close(self):
+        pass
+
+
+class VideoFile:
+    """The frames of a video file.
+
+    Requires opencv-python, imported when the video is opened. Frames read
+    in order are decoded without seeking."""
+
+    def __init__(self, fname):
+        import cv2
+        self.path = fname
+        self._cv2 = cv2
+        self._capture = cv2.VideoCapture(fname)
+        if not self._capture.isOpened():
+            raise OSError(f"Cannot open video {fname}.")
+        self._count = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._next = 0
+
+    def __len__(self):
+        return self._count
+
+    def name(self, i):
+        """Return the file name of a frame, numbered."""
+        return f"{self.path}#{i:06d}"
+
+    def read(self, i):
+        """Decode a frame, a null image past the end of the video."""
+        if i != self._next:
+            self._capture.set(self._cv2.CAP_PROP_POS_FRAMES, i)
+        ok, frame = self._capture.read()
+        self._next = i + 1
+        if not ok:
+            return QtGui.QImage()
+        height, width = frame.shape[:2]
+        image = QtGui.QImage(frame.data, width, height, frame.strides[0],
+                             QtGui.QImage.Format_RGB888)
+        return image.rgbSwapped()
+
+    def close(self):
+        self._capture.release()
+
+
+def open_frames(path):
+    """Return the frame source of a directory or video file."""
+    if os.path.isdir(path):
+        return FrameDirectory(path)
+    return VideoFile(path)
+
+
+class FrameBuffer(ImageCache):
+    """Decoded frames of a source, keyed by frame number and read ahead of
+    the current frame on the worker thread.
+
+    The oldest frames are dropped once over max_bytes, so the buffer holds
+    a window of frames about the one shown."""
+
+    def __init__(self, source, max_bytes=256 * 2**20, ahead=8):
+        super(FrameBuffer, self).__init__(max_bytes, workers=1)
+        self.source = source
+        self.ahead = ahead
+        self._read_lock = threading.Lock()
+
+    def read_ahead(self, i):
+        """Decode the frames after frame i."""
+        self.prefetch(range(i + 1, min(i + 1 + self.ahead,
+                                       len(self.source))))
+
+    def shutdown(self):
+        super(FrameBuffer, self).shutdown()
+        self.source.close()
+
+    def _decode(self, i):
+        """Read a frame; sources are read by one thread at a time."""
+        with self._read_lock:
+            return self.source.read(i)
+
+
+class Track:
+    """The (frames, N, 2) landmark positions of a sequence, NaN where a
+    frame is not labelled."""
+
+    def __init__(self, num_frames, num_points, index, keys, pos=None,
+                 source=""):
+        self.index = index
+        self.keys = keys
+        self.source = source
+        if pos is None:
+            pos = np.full((num_frames, num_points, 2), np.nan, np.float32)
+        self.pos = np.asarray(pos, dtype=np.float32).reshape(
+            num_frames, num_points, 2)
+
+    def __len__(self):
+        return len(self.pos)
+
+    def labelled(self, i):
+        """Return True if every point of a frame has a position."""
+        return bool(np.isfinite(self.pos[i]).all())
+
+    def set(self, i, pos):
+        """Store the positions of a frame."""
+        self.pos[i] = pos
+
+    def save(self, fname):
+        """Write the track as a .npz of the positions and the model index,
+        keys and source."""
+        header = dict(index={k: list(map(int, v))
+                             for k, v in self.index.items()},
+                      keys=list(self.keys), source=self.source)
+        np.savez(fname, pos=self.pos, header=json.dumps(header))
+
+    @classmethod
+    def load(cls, fname):
+        """Read a track saved with save()."""
+        with np.load(fname) as data:
+            header = json.loads(str(data["header"]))
+            pos = data["pos"]
+        return cls(len(pos), pos.shape[1], header["index"], header["keys"],
+                   pos, header["source"])
+
+
+def flow_available():
+    """Return True if opencv-python, needed for optical flow, imports."""
+    return importlib.util.find_spec("cv2") is not None
+
+
+def track_flow(previous, current, pos):
+    """Move positions from one frame to the next by pyramidal Lucas-Kanade
+    optical flow, keeping those that are lost.
+
+    Requires opencv-python."""
+    import cv2
+    prev_pts = np.asarray(pos, dtype=np.float32).reshape(-1, 1, 2)
+    next_pts, status, _ = cv2.calcOpticalFlowPyrLK(
+        gray_array(previous), gray_array(current), prev_pts, None,
+        winSize=(21, 21), maxLevel=3)
+    found = status.ravel() == 1
+    moved = np.asarray(pos, dtype=float).copy()
+    moved[found] = next_pts.reshape(-1, 2)[found]
+    return moved
+
+
+class Sequence:
+    """A frame source, its read ahead buffer and its landmark track."""
+
+    def __init__(self, source, num_points, index, keys, flow=False,
+                 track=None):
+        self.source = source
+        self.frames = FrameBuffer(source)
+        if track is None:
+            track = Track(len(source), num_points, index, keys,
+                          source=source.path)
+        self.track = track
+        self.flow = flow
+        self.frame = 0
+
+    def __len__(self):
+        return len(self.source)
+
+    def name(self, i=None):
+        """Return the name of a frame, by default the current one."""
+        return self.source.name(self.frame if i is None else i)
+
+    def image(self, i):
+        """Return the decoded frame, reading ahead of it."""
+        image = self.frames.get(i)
+        self.frames.read_ahead(i)
+        return image
+
+    def step(self, i, pos):
+        """Store pos in the current frame and move to frame i.
+
+        Return the positions to start frame i from: its own if labelled,
+        else pos carried forward, tracked by optical flow if enabled."""
+        self.track.set(self.frame, pos)
+        previous, self.frame = self.frame, i
+        if self.track.labelled(i):
+            return self.track.pos[i].astype(float)
+        if self.flow:
+            return track_flow(self.frames.get(previous),
+                              self.frames.get(i), pos)
+        return np.asarray(pos, dtype=float)
+
+    def close(self):
+        self.frames.shutdown()
+
+
+def open_sequence(path, num_points, index, keys, flow=False):
+    """Open a video, a frame directory, or a track .npz saved from either.
+
+    A new track has the given point count, model index and keys."""
+    if path.endswith(".npz"):
+        track = Track.load(path)
+        return Sequence(open_frames(track.source), track.pos.shape[1],
+                        track.index, track.keys, flow, track)
+    return Sequence(open_frames(path), num_points, index, keys, flow)
@@ -0,0 +1,169 @@
+"""Generalised Procrustes alignment and PCA shape modes of landmark sets.
+
+Shapes are streamed in chunks from saved model json files or binary
+datasets, so memory is bounded by the chunk size, and chunks are spread
+over a process pool. Build a model json with a mean shape and its modes:
+
+    flt stats model.json dataset/ landmarks/*.json --modes 10
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .dataset import HEADER, Dataset
+from .model import model, read_json, write_json
+
+
+def normalise(shape):
+    """Centre a (N, 2) shape and scale it to unit norm."""
+    shape = shape - shape.mean(axis=0)
+    return shape / np.linalg.norm(shape)
+
+
+def align(shapes, target):
+    """Similarity align (M, N, 2) shapes to a centred (N, 2) target.
+
+    Each shape is rotated, scaled and translated to minimise its squared
+    distance to the target, solved for all shapes at once as complex
+    least squares."""
+    z = shapes[..., 0] + 1j * shapes[..., 1]
+    z = z - z.mean(axis=1, keepdims=True)
+    w = target[:, 0] + 1j * target[:, 1]
+    a = (np.conj(z) @ w) / (np.abs(z)**2).sum(axis=1)
+    aligned = a[:, None] * z
+    return np.stack([aligned.real, aligned.imag], axis=-1)
+
+
+def chunks(paths, chunk=4096):
+    """Split dataset directories and json files into chunk descriptors."""
+    descs, fnames = [], []
+    for path in paths:
+        if os.path.exists(os.path.join(path, HEADER)):
+            rows = len(Dataset(path))
+            descs += [(path, i, min(i + chunk, rows))
+                      for i in range(0, rows, chunk)]
+        else:
+            fnames.append(path)
+    descs += [fnames[i:i + chunk] for i in range(0, len(fnames), chunk)]
+    return descs
+
+
+def load_chunk(desc):
+    """Load the (M, N, 2) shapes of a descriptor, dropping non finite."""
+    if isinstance(desc, tuple):
+        path, start, stop = desc
+        shapes = np.asarray(Dataset(path).points[start:stop], dtype=float)
+    else:
+        shapes = np.array([read_json(f)["pos"] for f in desc], dtype=float)
+    return shapes[np.isfinite(shapes).all(axis=(1, 2))]
+
+
+def _chunk_sums(job):
+    """Pool entry point: align a chunk to the mean and sum it.
+
+    With second=True, also sum the outer products of the flattened
+    aligned shapes, for the covariance."""
+    desc, mean, second = job
+    aligned = align(load_chunk(desc), mean).reshape(-1, mean.size)
+    outer = aligned.T @ aligned if second else None
+    return aligned.sum(axis=0), outer, len(aligned)
+
+
+class ShapeStats:
+    """The Procrustes mean shape and PCA modes of a set of shapes."""
+
+    def __init__(self, paths, chunk=4096, jobs=None):
+        self.descs = chunks(paths, chunk)
+        self.jobs = jobs
+        self.count = 0
+        self.mean = None
+        self.modes = None
+        self.variances = None
+
+    def _sums(self, pool, mean, second=False):
+        """Sum the aligned shapes over every chunk."""
+        total, outer, count = 0, 0, 0
+        jobs = [(desc, mean, second) for desc in self.descs]
+        for t, o, c in pool.map(_chunk_sums, jobs):
+            total, count = total + t, count + c
+            if second:
+                outer = outer + o
+        return total, outer, count
+
+    def fit(self, num_modes=10, iterations=20, tol=1e-8):
+        """Run Procrustes alignment to the mean, then PCA of the residuals.
+
+        Each iteration is one streamed pass over the data."""
+        loaded = (s for s in map(load_chunk, self.descs) if len(s))
+        first = next(loaded, None)
+        if first is None:
+            raise ValueError("No shapes to fit.")
+        mean = normalise(first[0])
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            for _ in range(iterations):
+                total, _, self.count = self._sums(pool, mean)
+                new = normalise(total.reshape(-1, 2) / self.count)
+                new = normalise(align(new[None], mean)[0])
+                change = np.linalg.norm(new - mean)
+                mean = new
+                if change < tol:
+                    break
+            total, outer, self.count = self._sums(pool, mean, second=True)
+        self.mean = mean
+        centre = total / self.count
+        cov = outer / self.count - np.outer(centre, centre)
+        variances, vectors = np.linalg.eigh(cov)
+        order = np.argsort(variances)[::-1][:num_modes]
+        self.variances = variances[order]
+        self.modes = vectors[:, order].T.reshape(len(order), -1, 2)
+        return self
+
+    def to_dict(self, index, keys, reference=model["pos"]):
+        """Return a model dict of the mean, placed like the reference.
+
+        The mean is similarity aligned to the reference if they have the
+        same points, else scaled to the reference bounds. Modes are unit
+        vectors in the normalised frame, with their variances."""
+        reference = np.asarray(reference, dtype=float)
+        centre = reference.mean(axis=0)
+        if reference.shape == self.mean.shape:
+            pos = align(self.mean[None], reference - centre)[0] + centre
+        else:
+            scale = ((reference.max(0) - reference.min(0)) /
+                     (self.mean.max(0) - self.mean.min(0))).min()
+            pos = self.mean * scale + centre
+        return dict(pos=pos.tolist(), index=index, keys=keys,
+                    modes=self.modes.tolist(),
+                    variances=self.variances.tolist(), count=self.count)
+
+
+def _index_keys(paths):
+    """Return the index and keys of the first dataset or json file."""
+    path = paths[0]
+    header = os.path.join(path, HEADER)
+    data = read_json(header if os.path.exists(header) else path)
+    return data["index"], data["keys"]
+
+
+def main(argv=None):
+    """Build a mean shape model json from saved landmarks."""
+    parser = argparse.ArgumentParser(
+        prog="flt stats", description="Procrustes mean shape and modes.")
+    parser.add_argument("out", help="model json to write")
+    parser.add_argument("inputs", nargs="+",
+                        help="dataset directories or saved model json files")
+    parser.add_argument("--modes", type=int, default=10,
+                        help="number of shape modes")
+    parser.add_argument("--chunk", type=int, default=4096,
+                        help="shapes per chunk")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes")
+    args = parser.parse_args(argv)
+    stats = ShapeStats(args.inputs, args.chunk, args.jobs).fit(args.modes)
+    index, keys = _index_keys(args.inputs)
+    write_json(stats.to_dict(index, keys), args.out)
+    print(f"{stats.count} shapes, {len(stats.variances)} modes written to "
+          f"{args.out}", file=sys.stderr)
+    return 0
@@ -0,0 +1,56 @@
+"""A uniform grid index for nearest landmark queries."""
+import math
+
+import numpy as np
+
+from .timing import PROFILER
+
+
+class GridIndex:
+    """Bucket store points into square cells to find the nearest quickly.
+
+    The grid is rebuilt, in one vectorised pass, on the first query after
+    the store has changed."""
+
+    def __init__(self, store, indices=None, cell=10.0):
+        self.store = store
+        if indices is None:
+            indices = np.arange(len(store))
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.cell = float(cell)
+        self.cells = {}
+        self.version = None
+
+    def build(self):
+        """Rebuild the cells from the current store positions."""
+        PROFILER.count("grid_build")
+        self.cells = {}
+        self.version = self.store.version
+        if not len(self.indices):
+            return
+        keys = np.floor(self.store.pos[self.indices] / self.cell)
+        keys = keys.astype(np.int64)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        keys = keys[order]
+        splits = np.flatnonzero(np.any(np.diff(keys, axis=0), axis=1)) + 1
+        starts = np.r_[0, splits]
+        stops = np.r_[splits, len(order)]
+        for key, start, stop in zip(keys[starts].tolist(), starts, stops):
+            self.cells[tuple(key)] = self.indices[order[start:stop]]
+
+    def nearest(self, x, y, radius):
+        """Return the index of the nearest point within radius, or None."""
+        if self.version != self.store.version:
+            self.build()
+        span = math.ceil(radius / self.cell)
+        cx, cy = math.floor(x / self.cell), math.floor(y / self.cell)
+        found = [self.cells[(i, j)]
+                 for i in range(cx - span, cx + span + 1)
+                 for j in range(cy - span, cy + span + 1)
+                 if (i, j) in self.cells]
+        if not found:
+            return None
+        idx = np.concatenate(found)
+        dist = ((self.store.pos[idx] - (x, y))**2).sum(axis=1)
+        best = np.argmin(dist)
+        return int(idx[best]) if dist[best] <= radius**2 else None
@@ -0,0 +1,195 @@
+"""Array backed landmark storage, usable without a scene."""
+import numpy as np
+
+
+class LandmarkStore:
+    """A contiguous (N, 2) float array of landmark positions.
+
+    The array is the single source of truth for a model. Groups are
+    described by ``index`` (name -> point indices) and drawn in ``keys``
+    order. Groups whose indices form a contiguous run are exposed as
+    slices, so reading them returns a view rather than a copy. The
+    version is bumped by every write made through the store's methods.
+
+    The store holds every point of the index, but models are saved, as
+    they always have been, with only the drawn points, in keys order; the
+    68 point layout of the default model, without its pupils.
+    """
+
+    def __init__(self, pos, index, keys):
+        self.pos = np.array(pos, dtype=np.float64).reshape(-1, 2)
+        self.index = {k: np.asarray(v, dtype=np.intp) for k, v in
+                      index.items()}
+        self.keys = list(keys)
+        self._slices = {k: _as_slice(v) for k, v in self.index.items()}
+        self.drawn = drawn_indices(self.index, self.keys)
+        self.version = 0
+
+    @classmethod
+    def from_dict(cls, model_dict):
+        """Build a store from a ``{pos, index, keys}`` dictionary, its pos
+        saved with only the drawn points or with every point."""
+        index, keys = model_dict["index"], model_dict["keys"]
+        return cls(full_positions(model_dict["pos"], index, keys), index,
+                   keys)
+
+    def __len__(self):
+        return len(self.pos)
+
+    def indices(self, key):
+        """Return the point indices of a group."""
+        return self._slices[key] or self.index[key]
+
+    def group(self, key):
+        """Return the positions of a group, a view where possible."""
+        return self.pos[self.indices(key)]
+
+    def set_group(self, key, pts):
+        """Overwrite the positions of a group."""
+        self.pos[self.indices(key)] = pts
+        self.version += 1
+
+    def set_positions(self, pos):
+        """Overwrite every position."""
+        self.pos[:] = pos
+        self.version += 1
+
+    def set_point(self, i, x, y):
+        """Set the position of a single point."""
+        self.pos[i, 0] = x
+        self.pos[i, 1] = y
+        self.version += 1
+
+    def move(self, indices, delta):
+        """Add (x, y) deltas to the positions at indices."""
+        self.pos[indices] += delta
+        self.version += 1
+
+    def centroid(self, key=None):
+        """Return the mean position of the model, or of a group."""
+        return self.pos[self._select(key)].mean(axis=0)
+
+    def affine(self, matrix, key=None):
+        """Apply a 2x3 affine matrix in place to the model, or a group."""
+        mat = np.asarray(matrix, dtype=np.float64).reshape(2, 3)
+        sel = self._select(key)
+        self.pos[sel] = self.pos[sel] @ mat[:, :2].T + mat[:, 2]
+        self.version += 1
+
+    def translate(self, dx, dy, key=None):
+        """Translate the model, or a group, in place."""
+        self.pos[self._select(key)] += (dx, dy)
+        self.version += 1
+
+    def scale(self, factor, key=None, centre=None):
+        """Scale in place about centre, by default the centroid."""
+        cx, cy = self.centroid(key) if centre is None else centre
+        self.affine([[factor, 0, cx - factor * cx],
+                     [0, factor, cy - factor * cy]], key)
+
+    def rotate(self, angle, key=None, centre=None):
+        """Rotate in place by angle degrees about centre, by default the
+        centroid."""
+        cx, cy = self.centroid(key) if centre is None else centre
+        c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+        self.affine([[c, -s, cx - c * cx + s * cy],
+                     [s, c, cy - s * cx - c * cy]], key)
+
+    def copy(self):
+        """Return an independent copy of the store."""
+        return LandmarkStore(self.pos.copy(), self.index, self.keys)
+
+    def like(self, pos=None):
+        """Return a store of new positions sharing this store's index.
+
+        Only the positions are allocated, so many instances of a model
+        share one index, key list and group slices."""
+        other = LandmarkStore.__new__(LandmarkStore)
+        other.pos = np.array(self.pos if pos is None else pos,
+                             dtype=np.float64).reshape(self.pos.shape)
+        other.index = self.index
+        other.keys = self.keys
+        other._slices = self._slices
+        other.drawn = self.drawn
+        other.version = 0
+        return other
+
+    def full_pos(self, pos):
+        """Return positions saved in either layout with every point."""
+        return full_positions(pos, self.index, self.keys)
+
+    def saved_pos(self):
+        """Return the drawn positions in keys order, as they are saved."""
+        return self.pos[self.drawn]
+
+    def to_dict(self):
+        """Return a json serialisable ``{pos, index, keys}`` dictionary,
+        in the saved layout."""
+        index = {k: v.tolist() for k, v in self.index.items()}
+        return dict(index=index, keys=list(self.keys),
+                    pos=self.saved_pos().tolist())
+
+    def _select(self, key):
+        """Return an index selecting the whole model, or a group."""
+        return slice(None) if key is None else self.indices(key)
+
+
+def drawn_indices(index, keys):
+    """Return the indices of the drawn points, group by group in keys
+    order, the order models are saved in."""
+    groups = [np.asarray(index[k], dtype=np.intp) for k in keys]
+    return np.concatenate(groups) if groups else np.zeros(0, np.intp)
+
+
+def index_size(index):
+    """Return the number of points an index numbers."""
+    return 1 + max((max(v) for v in index.values() if len(v)), default=-1)
+
+
+def full_positions(pos, index, keys):
+    """Return (N, 2) positions of every point of index.
+
+    pos holds either every point, or only the drawn ones in keys order;
+    points not drawn are then placed, a pupil at the centre of its eye,
+    else at the centre of the drawn points."""
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1, 2)
+    drawn = drawn_indices(index, keys)
+    if not len(drawn) or len(pos) != len(drawn):
+        return pos
+    full = np.full((index_size(index), 2), np.nan)
+    full[drawn] = pos
+    for key, idx in index.items():
+        eye = key.replace("pupil", "eye")
+        if eye != key and eye in index and np.isnan(full[idx]).any():
+            full[idx] = full[index[eye]].mean(axis=0)
+    full[np.isnan(full).any(axis=1)] = pos.mean(axis=0)
+    return full
+
+
+def saved_positions(pos, index, keys):
+    """Return positions held in either layout in the saved layout, the
+    drawn points in keys order. Raise ValueError if pos fits neither."""
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1, 2)
+    drawn = drawn_indices(index, keys)
+    if len(pos) == len(drawn):
+        return pos
+    if len(drawn) and len(pos) <= drawn.max():
+        raise ValueError(f"{len(pos)} points, the model saves {len(drawn)}")
+    return pos[drawn]
+
+
+def saved_index(index, keys):
+    """Return the index of the saved layout, each drawn group numbered in
+    keys order, so the saved positions alone form a valid model."""
+    saved, start = {}, 0
+    for key in keys:
+        saved[key] = list(range(start, start + len(index[key])))
+        start += len(index[key])
+    return saved
+
+
+def _as_slice(idx):
+    """Return a slice equivalent to idx if it is a contiguous run."""
+    if len(idx) and np.array_equal(idx, np.arange(idx[0], idx[0] + len(idx))):
+        return slice(int(idx[0]), int(idx[0]) + len(idx))
+    return None
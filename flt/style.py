@@ -0,0 +1,75 @@
+"""Shared pens and brushes for drawing landmark models."""
+from PyQt5 import QtCore, QtGui
+
+# Each theme names the colour of the group lines, the first marker and the
+# hover highlight. A palette, if given, colours the groups in turn.
+THEMES = dict(
+    default=dict(line="green", first="yellow", hover="red"),
+    contrast=dict(line="cyan", first="magenta", hover="orange"),
+    mono=dict(line="white", first="lightgray", hover="red"),
+    groups=dict(line="green", first="yellow", hover="red",
+                palette=["#e6194b", "#3cb44b", "#4363d8", "#f58231",
+                         "#911eb4", "#46f0f0", "#f032e6", "#bcf60c",
+                         "#fabebe"]),
+)
+
+
+class Style:
+    """Pens and brushes shared by every item in a scene.
+
+    Items keep a reference to these rather than their own copies, so a
+    theme or line width change rebuilds a handful of pens, then the model
+    is restyled once per group.
+    """
+
+    def __init__(self, theme="default", line=1.0):
+        self.theme = theme
+        self.line = line
+        self.group_colours = {}
+        self.no_brush = QtGui.QBrush(QtCore.Qt.NoBrush)
+        self.rebuild()
+
+    def rebuild(self):
+        """Build the shared pens for the current theme and line width."""
+        colours = THEMES[self.theme]
+        self._pens = {}
+        self.line_pen = self.pen(colours["line"])
+        self.first_pen = self.pen(colours["first"])
+        self.hover_pen = self.pen(colours["hover"])
+        self.selected_pen = QtGui.QPen(QtGui.QColor(colours["hover"]),
+                                       self.line, QtCore.Qt.DashLine)
+        fill = QtGui.QColor(colours["hover"])
+        fill.setAlpha(32)
+        self.hover_brush = QtGui.QBrush(fill)
+
+    def pen(self, colour):
+        """Return the shared pen of a colour at the current line width."""
+        if colour not in self._pens:
+            self._pens[colour] = QtGui.QPen(QtGui.QColor(colour), self.line)
+        return self._pens[colour]
+
+    def group_pen(self, key, i=0):
+        """Return the pen of a group, the i'th drawn in the model."""
+        if key in self.group_colours:
+            return self.pen(self.group_colours[key])
+        palette = THEMES[self.theme].get("palette")
+        if palette:
+            return self.pen(palette[i % len(palette)])
+        return self.line_pen
+
+    def set_line(self, line_width):
+        """Set the line width of every pen."""
+        self.line = line_width
+        self.rebuild()
+
+    def set_theme(self, theme):
+        """Set the theme by name, see THEMES."""
+        self.theme = theme
+        self.rebuild()
+
+    def set_group_colour(self, key, colour):
+        """Colour a group by name, or restore its theme colour with None."""
+        if colour is None:
+            self.group_colours.pop(key, None)
+        else:
+            self.group_colours[key] = colour
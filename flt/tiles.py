@@ -0,0 +1,170 @@
+"""A tiled, multi resolution image item for very large images."""
+import collections
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from .timing import PROFILER
+
+
+class TiledImageItem(QtWidgets.QGraphicsObject):
+    """Draw an image from a lazily built pyramid of tiles.
+
+    Only the tiles at the pyramid level matching the current zoom, and
+    within the exposed rect, are requested. Tiles are scaled from the
+    source image on worker threads and held as pixmaps in an LRU cache of
+    at most max_bytes. Until a tile is ready, a small preview is drawn.
+
+    Every level is drawn from tiles, full resolution too, so only the
+    tiles in view are held as pixmaps. The source QImage is only read to
+    cut tiles; it is shared with the window, which snapping and face
+    detection read, and never converted to a pixmap whole.
+    """
+    tile_ready = QtCore.pyqtSignal(int, object, object)
+
+    def __init__(self, tile_size=512, max_bytes=128 * 2**20, workers=2,
+                 parent=None):
+        super(TiledImageItem, self).__init__(parent)
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption,
+                     True)
+        self.tile_size = tile_size
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.m_image = QtGui.QImage()
+        self.m_preview = QtGui.QPixmap()
+        self.m_tiles = collections.OrderedDict()
+        self.m_pending = set()
+        self.m_generation = 0
+        self.m_lock = threading.Lock()
+        self.m_pool = ThreadPoolExecutor(max_workers=workers)
+        self.tile_ready.connect(self.add_tile)
+
+    def set_image(self, image):
+        """Set the source QImage, dropping all tiles."""
+        self.prepareGeometryChange()
+        with self.m_lock:
+            self.m_generation += 1
+            self.m_pending.clear()
+        self.m_tiles.clear()
+        self.nbytes = 0
+        self.m_image = image
+        self.m_preview = QtGui.QPixmap()
+        if not image.isNull():
+            self.m_pool.submit(self._make_preview, self.m_generation, image)
+        self.update()
+
+    def clear(self):
+        """Remove the image."""
+        self.set_image(QtGui.QImage())
+
+    def max_level(self):
+        """The coarsest level, where the image fits in a single tile."""
+        size = max(self.m_image.width(), self.m_image.height(), 1)
+        return max(0, math.ceil(math.log2(size / self.tile_size)))
+
+    def level_for(self, lod):
+        """Return the pyramid level to draw at a level of detail."""
+        if lod <= 0:
+            return self.max_level()
+        level = math.floor(math.log2(1. / lod)) if lod < 1 else 0
+        return min(max(level, 0), self.max_level())
+
+    def tile_rect(self, level, col, row):
+        """Return the tile rect in source image coordinates."""
+        span = self.tile_size * 2**level
+        rect = QtCore.QRect(col * span, row * span, span, span)
+        return rect.intersected(self.m_image.rect())
+
+    def boundingRect(self):
+        """Override super."""
+        return QtCore.QRectF(self.m_image.rect())
+
+    def paint(self, painter, option, widget=None):
+        """Override super, drawing the exposed tiles at the zoom level."""
+        if self.m_image.isNull():
+            return
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for(lod)
+        span = self.tile_size * 2**level
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        cols = range(int(exposed.left() // span),
+                     int(math.ceil(exposed.right() / span)))
+        rows = range(int(exposed.top() // span),
+                     int(math.ceil(exposed.bottom() / span)))
+        for row in rows:
+            for col in cols:
+                key = (level, col, row)
+                target = QtCore.QRectF(self.tile_rect(*key))
+                pixmap = self.m_tiles.get(key)
+                if pixmap is not None:
+                    self.m_tiles.move_to_end(key)
+                    painter.drawPixmap(target, pixmap,
+                                       QtCore.QRectF(pixmap.rect()))
+                    continue
+                self.request_tile(key)
+                if not self.m_preview.isNull():
+                    ratio = self.m_preview.width() / self.m_image.width()
+                    source = QtCore.QRectF(
+                        target.x() * ratio, target.y() * ratio,
+                        target.width() * ratio, target.height() * ratio)
+                    painter.drawPixmap(target, self.m_preview, source)
+
+    def request_tile(self, key):
+        """Queue a tile to be scaled on a worker thread."""
+        with self.m_lock:
+            if key in self.m_pending:
+                return
+            self.m_pending.add(key)
+        PROFILER.count("tile_request")
+        self.m_pool.submit(self._make_tile, self.m_generation,
+                           self.m_image, key, self.tile_rect(*key))
+
+    @QtCore.pyqtSlot(int, object, object)
+    def add_tile(self, generation, key, image):
+        """Cache a finished tile as a pixmap and evict to max_bytes."""
+        with self.m_lock:
+            if generation != self.m_generation:
+                return
+            self.m_pending.discard(key)
+        pixmap = QtGui.QPixmap.fromImage(image)
+        if key is None:
+            self.m_preview = pixmap
+        else:
+            self.m_tiles[key] = pixmap
+            self.nbytes += _pixmap_bytes(pixmap)
+            while self.nbytes > self.max_bytes and len(self.m_tiles) > 1:
+                _, old = self.m_tiles.popitem(last=False)
+                self.nbytes -= _pixmap_bytes(old)
+                PROFILER.count("tile_evict")
+        self.update()
+
+    def shutdown(self):
+        """Stop the worker threads, dropping queued tiles."""
+        self.m_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _make_tile(self, generation, image, key, rect):
+        """Worker: cut a region of the source image, scaled to its level,
+        as a tile."""
+        if generation != self.m_generation:
+            return
+        scale = 2**key[0]
+        tile = image.copy(rect)
+        if scale > 1:
+            tile = tile.scaled(
+                max(1, rect.width() // scale), max(1, rect.height() // scale),
+                QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+        self.tile_ready.emit(generation, key, tile)
+
+    def _make_preview(self, generation, image):
+        """Worker: scale the whole image down to a single tile."""
+        preview = image.scaled(self.tile_size, self.tile_size,
+                               QtCore.Qt.KeepAspectRatio,
+                               QtCore.Qt.SmoothTransformation)
+        self.tile_ready.emit(generation, None, preview)
+
+
+def _pixmap_bytes(pixmap):
+    """Approximate memory held by a pixmap."""
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
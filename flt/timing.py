@@ -0,0 +1,98 @@
+"""Timers and counters on the labeller's hot paths.
+
+Timing is off until PROFILER.enabled is set, and then costs two clock
+reads and a lock per call, as workers record too. Results are written as
+a json summary, or as Chrome trace events for chrome://tracing or
+https://ui.perfetto.dev.
+"""
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Profiler:
+    """Named timers and counters, and a bounded trace of timed calls.
+
+    Safe to record from worker threads."""
+
+    def __init__(self, max_events=2**20):
+        self.enabled = False
+        self.times = collections.defaultdict(lambda: [0, 0.0, 0.0])
+        self.counts = collections.Counter()
+        self.events = collections.deque(maxlen=max_events)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, start, stop):
+        """Add a timed call from start to stop, in perf_counter seconds."""
+        elapsed = stop - start
+        with self._lock:
+            stats = self.times[name]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            self.events.append((name, start, elapsed,
+                                threading.get_ident()))
+
+    def count(self, name, n=1):
+        """Add n to a counter, if enabled."""
+        if self.enabled:
+            with self._lock:
+                self.counts[name] += n
+
+    def reset(self):
+        """Drop everything recorded."""
+        with self._lock:
+            self.times.clear()
+            self.counts.clear()
+            self.events.clear()
+            self._start = time.perf_counter()
+
+    def to_dict(self):
+        """Return the calls, total and mean and max ms of each timer, and
+        the counters."""
+        with self._lock:
+            times = {name: list(stats) for name, stats in self.times.items()}
+            counts = dict(self.counts)
+        timers = {name: dict(calls=calls, total_ms=total * 1000,
+                             mean_ms=total * 1000 / calls,
+                             max_ms=longest * 1000)
+                  for name, (calls, total, longest) in times.items()}
+        return dict(timers=timers, counters=counts)
+
+    def to_trace(self):
+        """Return the timed calls as Chrome trace events."""
+        pid = os.getpid()
+        with self._lock:
+            recorded = list(self.events)
+        events = [dict(name=name, ph="X", pid=pid, tid=tid,
+                       ts=(start - self._start) * 1e6, dur=elapsed * 1e6)
+                  for name, start, elapsed, tid in recorded]
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def save(self, fname, trace=False):
+        """Write the summary, or the Chrome trace, as json."""
+        with open(fname, "w") as fid:
+            json.dump(self.to_trace() if trace else self.to_dict(), fid)
+
+
+PROFILER = Profiler()
+
+
+def timed(name):
+    """Decorate a function to record its calls under name when profiling."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(name, start, time.perf_counter())
+        return wrapper
+    return decorate
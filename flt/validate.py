@@ -0,0 +1,286 @@
+"""Check saved landmarks for broken files and outlying shapes.
+
+Reads saved model json files, and the records of print_pos logs, in
+chunks across a process pool, and reports files whose ``{pos, index,
+keys}`` do not agree, with NaNs, repeated points, points outside their
+image, shapes far from the reference after Procrustes alignment, or the
+same shape as another file:
+
+    flt validate landmarks/*.json lm.txt --images imgs/ -o report.json
+"""
+import argparse
+import collections
+import hashlib
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .convert import image_name, stem
+from .dataset import log_records
+from .imageinfo import image_size
+from .model import model, read_json
+from .shapestats import align, normalise
+from .store import drawn_indices, saved_positions
+
+CHUNK = 1000
+# Chunks sent to the pool at once, bounding how much of the stream is read.
+BATCH = 16
+# Residuals this many robust standard deviations over the median are
+# outliers.
+OUTLIER_SIGMA = 5.0
+
+
+def items(paths):
+    """Yield json file names, and the (source, name, pos) records of logs,
+    the source being "<log>:<line>" and pos None for a line that does not
+    parse."""
+    for path in paths:
+        if path.endswith(".json"):
+            yield path
+        else:
+            for lineno, name, pos in log_records(path):
+                yield f"{path}:{lineno}", name, pos
+
+
+def load(item):
+    """Return the source, image name and model dict of an item, or a
+    problem in place of the model dict."""
+    if isinstance(item, str):
+        try:
+            return item, stem(item), read_json(item)
+        except (OSError, ValueError) as err:
+            return item, stem(item), f"unreadable: {err}"
+    source, name, pos = item
+    if pos is None:
+        return source, source, f"unreadable: {source}"
+    name = str(name)
+    return source, name, dict(pos=pos, index=model["index"],
+                              keys=model["keys"])
+
+
+def check_schema(model_dict):
+    """Return the problems of a model dict's structure, and its (N, 2)
+    positions in the saved layout, the drawn points in keys order, if they
+    can be read.
+
+    Positions of every point of the index, or of only the drawn ones, as
+    the 68 points of files saved before the pupils were stored, are
+    accepted."""
+    if not isinstance(model_dict, dict):
+        return ["not a model dict"], None
+    missing = [k for k in ("pos", "index", "keys") if k not in model_dict]
+    if missing:
+        return [f"missing {', '.join(missing)}"], None
+    try:
+        pos = np.asarray(model_dict["pos"], dtype=float)
+    except (TypeError, ValueError):
+        return ["pos is not numeric"], None
+    if pos.ndim != 2 or pos.shape[1] != 2:
+        return ["pos is not a list of (x, y)"], None
+    problems = []
+    index, keys = model_dict["index"], model_dict["keys"]
+    if not isinstance(keys, list) or not all(isinstance(k, str)
+                                             for k in keys):
+        problems.append("keys is not a list of names")
+    if not isinstance(index, dict) or not all(
+            isinstance(group, list) and
+            all(isinstance(i, int) for i in group)
+            for group in index.values()):
+        problems.append("index is not a dict of int lists")
+    if problems:
+        return problems, None
+    unknown = [k for k in keys if k not in index]
+    if unknown:
+        return [f"keys not in index: {', '.join(unknown)}"], None
+    indices = np.fromiter(itertools.chain.from_iterable(index.values()),
+                          dtype=int)
+    drawn = drawn_indices(index, keys)
+    count = int(indices.max()) + 1 if len(indices) else 0
+    if (indices < 0).any():
+        return ["index out of range of pos"], None
+    if len(pos) == len(drawn):
+        return problems, pos
+    if len(pos) != count:
+        return [f"point count: {len(pos)}, the index has {len(drawn)} "
+                f"drawn of {count}"], None
+    if len(np.unique(indices)) < len(pos):
+        problems.append("points in no group")
+    return problems, saved_positions(pos, index, keys)
+
+
+def _image_sizes(names, image_dir):
+    """Return the (M, 2) sizes of the named images, NaN if not found."""
+    sizes = np.full((len(names), 2), np.nan)
+    for i, name in enumerate(names):
+        path = os.path.join(image_dir, name)
+        if not os.path.exists(path):
+            path = os.path.join(image_dir, image_name(name, image_dir))
+        if os.path.exists(path):
+            try:
+                sizes[i] = image_size(path)
+            except (OSError, ValueError):
+                pass
+    return sizes
+
+
+def check_shapes(shapes, reference, sizes=None):
+    """Check (M, N, 2) shapes at once against a (N, 2) reference.
+
+    Return the problems of each shape and its Procrustes residual, the
+    distance of the aligned shape from the unit reference."""
+    problems = [[] for _ in shapes]
+    finite = np.isfinite(shapes).all(axis=(1, 2))
+    z = np.round(shapes[..., 0], 3) + 1j * np.round(shapes[..., 1], 3)
+    z = np.sort(z, axis=1)
+    repeated = (np.diff(z, axis=1) == 0).any(axis=1)
+    outside = np.zeros(len(shapes), dtype=bool)
+    if sizes is not None:
+        known = np.isfinite(sizes).all(axis=1) & finite
+        outside[known] = ((shapes[known] < 0) |
+                          (shapes[known] > sizes[known, None, :])).any(
+                              axis=(1, 2))
+    residual = np.full(len(shapes), np.nan)
+    if finite.any():
+        target = normalise(reference)
+        aligned = align(shapes[finite], target)
+        residual[finite] = np.linalg.norm(aligned - target, axis=(1, 2))
+    for i in np.flatnonzero(~finite):
+        problems[i].append("non finite positions")
+    for i in np.flatnonzero(repeated):
+        problems[i].append("repeated points")
+    for i in np.flatnonzero(outside):
+        problems[i].append("points outside the image")
+    return problems, residual
+
+
+def check_chunk(job):
+    """Pool entry point: check a chunk of items.
+
+    Return the source, image name, problems, residual and shape digest of
+    each."""
+    chunk, reference, image_dir = job
+    results, names, shapes, rows = [], [], [], []
+    for item in chunk:
+        source, name, model_dict = load(item)
+        if isinstance(model_dict, str):
+            results.append([source, name, [model_dict], None, None])
+            continue
+        problems, pos = check_schema(model_dict)
+        digest = None
+        if pos is not None:
+            digest = hashlib.sha1(np.round(pos, 2).tobytes()).hexdigest()
+            if pos.shape != reference.shape:
+                problems.append(f"point count: {len(pos)}, the reference "
+                                f"has {len(reference)}")
+            else:
+                names.append(name)
+                shapes.append(pos)
+                rows.append(len(results))
+        results.append([source, name, problems, None, digest])
+    if shapes:
+        sizes = _image_sizes(names, image_dir) if image_dir else None
+        problems, residual = check_shapes(np.array(shapes), reference, sizes)
+        for row, extra, r in zip(rows, problems, residual):
+            results[row][2] += extra
+            results[row][3] = None if np.isnan(r) else float(r)
+    return results
+
+
+def reference_shape(model_dict=model):
+    """Return the saved layout positions of a model, to check against."""
+    return saved_positions(model_dict["pos"], model_dict["index"],
+                           model_dict["keys"])
+
+
+def validate(paths, reference=None, image_dir=None, jobs=None,
+             sigma=OUTLIER_SIGMA):
+    """Check every file and log record, return the report dict.
+
+    Results are keyed by source, the json file or "<log>:<line>".
+    Problems are "kind: detail" strings, counted by kind. A shape is only
+    reported as the same as another if that is of a different image, so
+    an image saved twice unchanged is not. reference is (N, 2) positions
+    in the saved layout, by default those of the built in model."""
+    if reference is None:
+        reference = reference_shape()
+    reference = np.asarray(reference, dtype=float)
+    problems = {}
+    residuals, digests = {}, {}
+    count = 0
+    stream = items(paths)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while True:
+            chunks = [list(itertools.islice(stream, CHUNK))
+                      for _ in range(BATCH)]
+            batch = [(c, reference, image_dir) for c in chunks if c]
+            if not batch:
+                break
+            for results in pool.map(check_chunk, batch):
+                for source, name, found, residual, digest in results:
+                    count += 1
+                    if found:
+                        problems[source] = found
+                    if residual is not None:
+                        residuals[source] = residual
+                    if digest is not None:
+                        digests.setdefault(digest, []).append((source, name))
+
+    for sources in digests.values():
+        first, image = sources[0][0], stem(sources[0][1])
+        for source, name in sources[1:]:
+            if stem(name) != image:
+                problems.setdefault(source, []).append(
+                    f"same shape: as {first}")
+    summary = {}
+    if residuals:
+        values = np.fromiter(residuals.values(), dtype=float)
+        median = float(np.median(values))
+        spread = 1.4826 * float(np.median(np.abs(values - median)))
+        threshold = median + sigma * spread
+        for source, residual in residuals.items():
+            if spread and residual > threshold:
+                problems.setdefault(source, []).append(
+                    f"outlier shape: residual {residual:0.3f}")
+        summary = dict(median=median, threshold=threshold)
+    counts = collections.Counter(p.split(":")[0] for found in
+                                 problems.values() for p in found)
+    return dict(files=count, valid=count - len(problems),
+                problems=dict(counts), residual=summary,
+                files_with_problems=problems)
+
+
+def main(argv=None):
+    """Validate saved landmarks and report the problems found."""
+    parser = argparse.ArgumentParser(
+        prog="flt validate", description="Check saved landmark files.")
+    parser.add_argument("inputs", nargs="+",
+                        help="saved model json files or print_pos logs")
+    parser.add_argument("--images", help="image directory, to check bounds")
+    parser.add_argument("--reference",
+                        help="model json of the expected shape, default is "
+                        "the built in model")
+    parser.add_argument("--sigma", type=float, default=OUTLIER_SIGMA,
+                        help="outlier threshold in robust deviations")
+    parser.add_argument("-o", "--out", help="write the json report here")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes")
+    args = parser.parse_args(argv)
+
+    reference = reference_shape()
+    if args.reference:
+        reference = reference_shape(read_json(args.reference))
+    report = validate(args.inputs, reference, args.images, args.jobs,
+                      args.sigma)
+    if args.out:
+        with open(args.out, "w") as fid:
+            json.dump(report, fid, indent=1)
+    else:
+        for name, found in sorted(report["files_with_problems"].items()):
+            print(f"{name}: {'; '.join(found)}")
+    for problem, n in sorted(report["problems"].items()):
+        print(f"{n:8d} {problem}", file=sys.stderr)
+    print(f"{report['valid']} of {report['files']} valid", file=sys.stderr)
+    return 1 if report["files_with_problems"] else 0
@@ -8,5 +8,5 @@ setup(name='flt',
       py_modules=["flt"],
       zip_safe=False,
       entry_points={'console_scripts': [
-          "flt=flt.flt:main",]}
+          "flt=flt.cli:main",]}
       )
@@ -0,0 +1,43 @@
+"""Tests of the annotation log and its index."""
+from flt.annolog import AnnotationLog, LogIndex
+
+
+def test_write_after_torn_line(tmp_path):
+    fname = str(tmp_path / "log.jsonl")
+    with AnnotationLog(fname) as log:
+        log.write("z.jpg", [[1, 1]])
+    # A crash while writing a newer record of the same image.
+    with open(fname, "ab") as fid:
+        fid.write(b'{"image": "z.jpg", "pos": [[2,')
+    with AnnotationLog(fname) as log:
+        log.write("w.jpg", [[3, 3]])
+
+    index = LogIndex(fname)
+    assert sorted(index.images()) == ["w.jpg", "z.jpg"]
+    assert index.latest("z.jpg")["pos"] == [[1, 1]]
+    assert index.latest("w.jpg")["pos"] == [[3, 3]]
+
+
+def test_index_skips_unparsable_lines(tmp_path):
+    fname = str(tmp_path / "log.jsonl")
+    with AnnotationLog(fname) as log:
+        log.write("z.jpg", [[1, 1]])
+    # A torn line already closed by a newline, as older logs may hold.
+    with open(fname, "ab") as fid:
+        fid.write(b'{"image": "z.jpg", "pos": [[2,\n')
+    index = LogIndex(fname)
+    assert index.latest("z.jpg")["pos"] == [[1, 1]]
+
+
+def test_torn_index_is_rebuilt(tmp_path):
+    fname = str(tmp_path / "log.jsonl")
+    with AnnotationLog(fname) as log:
+        log.write("z.jpg", [[1, 1]])
+        log.write("w.jpg", [[3, 3]])
+    # An index cut short by a crash, as written before it was atomic.
+    with open(f"{fname}.idx", "w") as fid:
+        fid.write('{"size": 40, "offsets": {"z.jpg"')
+    index = LogIndex(fname)
+    assert sorted(index.images()) == ["w.jpg", "z.jpg"]
+    assert index.latest("w.jpg")["pos"] == [[3, 3]]
+    assert LogIndex(fname).offsets == index.offsets
@@ -0,0 +1,81 @@
+"""Round trips of landmarks through .pts, csv and COCO files."""
+import io
+import json
+
+import numpy as np
+
+from flt.convert import (JsonStream, export_pts, import_pts, read_coco,
+                         read_csv, read_pts, to_model, write_coco, write_csv)
+from flt.model import model, read_json, write_json
+from flt.store import LandmarkStore
+
+SAVED = np.asarray(LandmarkStore.from_dict(model).to_dict()["pos"])
+
+
+def write_models(tmp_path, count=3):
+    """Write count saved models, shifted apart, and return their names."""
+    fnames = []
+    for i in range(count):
+        fname = str(tmp_path / f"im{i}.json")
+        write_json(to_model(SAVED + i), fname)
+        fnames.append(fname)
+    return fnames
+
+
+def test_to_model_saves_the_drawn_points():
+    full = np.asarray(model["pos"], dtype=float)
+    np.testing.assert_allclose(to_model(full[:68])["pos"], full[:68])
+    np.testing.assert_allclose(to_model(full)["pos"], full[:68])
+
+
+def test_pts_round_trip(tmp_path):
+    (tmp_path / "pts").mkdir()
+    (tmp_path / "lm").mkdir()
+    fname = write_models(tmp_path, 1)[0]
+    export_pts(fname, str(tmp_path / "pts"))
+    assert read_pts(str(tmp_path / "pts" / "im0.pts")).shape == (68, 2)
+    import_pts(str(tmp_path / "pts" / "im0.pts"), str(tmp_path / "lm"))
+    saved = read_json(str(tmp_path / "lm" / "im0.json"))
+    np.testing.assert_allclose(saved["pos"], SAVED, atol=1e-3)
+
+
+def test_csv_round_trip_skips_bad_files(tmp_path):
+    fnames = write_models(tmp_path)
+    (tmp_path / "bad.json").write_text('{"pos": [[1, 2')
+    out = str(tmp_path / "points.csv")
+    count, errors = write_csv(fnames + [str(tmp_path / "bad.json")], out)
+    assert count == 4 and len(errors) == 1 and "bad.json" in errors[0]
+    rows = list(read_csv(out))
+    assert [name for name, _ in rows] == ["im0", "im1", "im2"]
+    for i, (_, points) in enumerate(rows):
+        np.testing.assert_allclose(to_model(points)["pos"], SAVED + i,
+                                   atol=1e-3)
+
+
+def test_coco_round_trip(tmp_path):
+    fnames = write_models(tmp_path)
+    out = str(tmp_path / "keypoints.json")
+    count, errors = write_coco(fnames, out)
+    assert count == 3 and not errors
+    rows = list(read_coco(out))
+    assert [name for name, _ in rows] == ["im0", "im1", "im2"]
+    for i, (_, points) in enumerate(rows):
+        np.testing.assert_allclose(to_model(points)["pos"], SAVED + i,
+                                   atol=1e-3)
+
+
+def test_coco_export_of_fewer_points(tmp_path):
+    out = str(tmp_path / "keypoints.json")
+    write_coco(write_models(tmp_path, 1), out, num_points=17)
+    data = read_json(out)
+    assert data["categories"][0]["keypoints"][-1] == "jaw_16"
+    assert len(data["annotations"][0]["keypoints"]) == 17 * 3
+
+
+def test_stream_reads_across_blocks():
+    data = dict(info={"year": 2024}, images=[{"id": i, "n": 12345.678}
+                                             for i in range(50)])
+    stream = JsonStream(io.StringIO(json.dumps(data)), block=7)
+    items = list(stream.items())
+    assert items[0] == ("info", {"year": 2024})
+    assert [v for k, v in items[1:]] == data["images"]
@@ -0,0 +1,64 @@
+"""Tests of the binary landmark dataset."""
+import json
+import os
+
+import numpy as np
+
+from flt.dataset import NAMES, POINTS, Dataset, DatasetWriter, from_log
+from flt.model import model
+
+
+def test_append_after_torn_write(tmp_path):
+    path = str(tmp_path / "ds")
+    with DatasetWriter(path, 2) as writer:
+        writer.append("a", [[1, 1], [2, 2]])
+    # A crash mid row: half a row of points, a name without its newline.
+    with open(os.path.join(path, POINTS), "ab") as fid:
+        fid.write(np.zeros(2, dtype="<f4").tobytes())
+    with open(os.path.join(path, NAMES), "a") as fid:
+        fid.write("tor")
+    assert Dataset(path).names == ["a"]
+
+    with DatasetWriter(path, 2) as writer:
+        writer.append("b", [[3, 3], [4, 4]])
+        writer.append("c", [[5, 5], [6, 6]])
+    dataset = Dataset(path)
+    assert dataset.names == ["a", "b", "c"]
+    np.testing.assert_array_equal(dataset.get("a"), [[1, 1], [2, 2]])
+    np.testing.assert_array_equal(dataset.get("b"), [[3, 3], [4, 4]])
+    np.testing.assert_array_equal(dataset.get("c"), [[5, 5], [6, 6]])
+
+
+def test_append_after_names_lost(tmp_path):
+    path = str(tmp_path / "ds")
+    with DatasetWriter(path, 1) as writer:
+        writer.extend(["a", "b"], [[[1, 1]], [[2, 2]]])
+    # Points flushed, names not: the second row has no name.
+    with open(os.path.join(path, NAMES), "w") as fid:
+        fid.write("a\n")
+    with DatasetWriter(path, 1) as writer:
+        writer.append("c", [[3, 3]])
+    dataset = Dataset(path)
+    assert dataset.names == ["a", "c"]
+    np.testing.assert_array_equal(dataset.get("c"), [[3, 3]])
+
+
+def test_from_log_of_mixed_point_counts(tmp_path):
+    full = np.asarray(model["pos"], dtype=float)
+    log = tmp_path / "lm.txt"
+    log.write_text(
+        f'"a.jpg" : {json.dumps(full[:68].tolist())}\n'
+        f'"b.jpg" : {json.dumps((full + 1).tolist())}\n'
+        '"c.jpg" : [[1, 2], [3, 4]]\n'
+        '"d.jpg" : [[1, 2\n')
+    path = str(tmp_path / "ds")
+    skipped = []
+    assert from_log(str(log), path, skipped=skipped) == 2
+    assert skipped == [3, 4]
+    dataset = Dataset(path)
+    assert dataset.header["num_points"] == 68
+    assert max(max(v) for v in dataset.index.values()) == 67
+    np.testing.assert_allclose(dataset.get("b.jpg"), full[:68] + 1)
+    # A log of the same model appends to it.
+    assert from_log(str(log), path) == 2
+    assert len(Dataset(path)) == 4
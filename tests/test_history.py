@@ -0,0 +1,69 @@
+"""Tests of delta based undo and redo."""
+import numpy as np
+
+from flt.history import History
+from flt.model import model
+from flt.store import LandmarkStore
+
+
+def make():
+    store = LandmarkStore(model["pos"], model["index"], model["keys"])
+    return store, History(store)
+
+
+def test_undo_and_redo_only_record_what_moved():
+    store, history = make()
+    start = store.pos.copy()
+    history.begin()
+    store.translate(5, -3, "left_eye")
+    edit = history.commit("move eye")
+    np.testing.assert_array_equal(edit.indices, model["index"]["left_eye"])
+    moved = store.pos.copy()
+
+    np.testing.assert_array_equal(history.undo(), edit.indices)
+    np.testing.assert_allclose(store.pos, start)
+    np.testing.assert_array_equal(history.redo(), edit.indices)
+    np.testing.assert_allclose(store.pos, moved)
+    assert history.redo() is None
+
+
+def test_nested_edits_merge_and_empty_edits_are_dropped():
+    store, history = make()
+    history.begin()
+    store.translate(1, 0, "jaw")
+    history.begin()
+    store.translate(0, 1, "mouth_inner")
+    assert history.commit() is None
+    edit = history.commit("both")
+    assert len(history.undo_stack) == 1
+    assert len(edit.indices) == (len(model["index"]["jaw"]) +
+                                 len(model["index"]["mouth_inner"]))
+    history.begin()
+    assert history.commit() is None
+    assert len(history.undo_stack) == 1
+
+
+def test_new_edit_clears_redo():
+    store, history = make()
+    for dx in (1, 2):
+        history.begin()
+        store.translate(dx, 0)
+        history.commit()
+    history.undo()
+    history.begin()
+    store.translate(0, 1)
+    history.commit()
+    assert history.redo_stack == []
+
+
+def test_oldest_edits_dropped_over_budget():
+    store, history = make()
+    assert history.max_bytes == 8 * 2**20
+    history.max_bytes = 3000
+    for _ in range(10):
+        history.begin()
+        store.translate(1, 1)
+        history.commit()
+    assert history.nbytes <= history.max_bytes
+    assert history.nbytes == sum(e.nbytes for e in history.undo_stack)
+    assert 1 <= len(history.undo_stack) < 10
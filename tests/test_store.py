@@ -0,0 +1,51 @@
+"""Tests of the in place transforms of LandmarkStore."""
+import numpy as np
+
+from flt.model import model
+from flt.store import LandmarkStore
+
+
+def make():
+    return LandmarkStore(model["pos"], model["index"], model["keys"])
+
+
+def test_affine_of_a_group_leaves_the_rest():
+    store = make()
+    before = store.pos.copy()
+    eye = model["index"]["left_eye"]
+    store.affine([[1, 0, 10], [0, 2, 0]], "left_eye")
+    expected = before[eye] * (1, 2) + (10, 0)
+    np.testing.assert_allclose(store.group("left_eye"), expected)
+    rest = np.setdiff1d(np.arange(len(store)), eye)
+    np.testing.assert_allclose(store.pos[rest], before[rest])
+    assert store.version == 1
+
+
+def test_scale_keeps_the_centroid():
+    store = make()
+    centre = store.centroid()
+    spread = np.abs(store.pos - centre).max()
+    store.scale(2)
+    np.testing.assert_allclose(store.centroid(), centre)
+    np.testing.assert_allclose(np.abs(store.pos - centre).max(), 2 * spread)
+
+
+def test_rotate_about_a_point():
+    store = make()
+    before = store.pos.copy()
+    store.rotate(90, centre=(0, 0))
+    np.testing.assert_allclose(store.pos[:, 0], -before[:, 1], atol=1e-9)
+    np.testing.assert_allclose(store.pos[:, 1], before[:, 0], atol=1e-9)
+    store.rotate(-90, centre=(0, 0))
+    np.testing.assert_allclose(store.pos, before, atol=1e-9)
+
+
+def test_like_shares_the_index():
+    store = make()
+    other = store.like(store.pos + 1)
+    assert other.index is store.index and other.keys is store.keys
+    assert other.pos is not store.pos and other.version == 0
+    other.translate(1, 1, "jaw")
+    np.testing.assert_allclose(other.group("jaw"), store.group("jaw") + 2)
+    np.testing.assert_array_equal(other.saved_pos(),
+                                  other.pos[store.drawn])
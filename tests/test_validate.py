@@ -0,0 +1,75 @@
+"""Tests of flt validate on broken and legacy input."""
+import json
+
+from flt.model import model
+from flt.store import LandmarkStore
+from flt.validate import validate
+
+# A model as saved, with the 68 drawn points.
+SAVED = LandmarkStore.from_dict(model).to_dict()
+
+
+def write(path, data):
+    with open(path, "w") as fid:
+        json.dump(data, fid)
+    return str(path)
+
+
+def log_line(name, pos):
+    return f"{json.dumps(name)} : {json.dumps(pos)}\n"
+
+
+def test_reports_bad_structure(tmp_path):
+    fnames = [
+        write(tmp_path / "good.json", SAVED),
+        write(tmp_path / "index.json", dict(SAVED, index=[[0]])),
+        write(tmp_path / "groups.json", dict(SAVED, index={"a": [0.5]})),
+        write(tmp_path / "keys.json", dict(SAVED, keys=None)),
+        write(tmp_path / "list.json", [1, 2]),
+    ]
+    report = validate(fnames, jobs=1)
+    found = report["files_with_problems"]
+    assert fnames[0] not in found
+    assert found[fnames[1]] == ["index is not a dict of int lists"]
+    assert found[fnames[2]] == ["index is not a dict of int lists"]
+    assert found[fnames[3]] == ["keys is not a list of names"]
+    assert found[fnames[4]] == ["not a model dict"]
+
+
+def test_accepts_saved_and_full_layouts(tmp_path):
+    fnames = [write(tmp_path / "a.json", SAVED),
+              write(tmp_path / "b.json", model)]
+    log = tmp_path / "lm.txt"
+    log.write_text(log_line("c.jpg", SAVED["pos"]) +
+                   log_line("d.jpg", model["pos"]))
+    report = validate(fnames + [str(log)], jobs=1)
+    assert report["files"] == 4
+    # Only the same shape, saved for different images, is reported.
+    assert all(p[0].startswith("same shape") for p in
+               report["files_with_problems"].values())
+
+
+def test_checks_legacy_shapes(tmp_path):
+    pos = [list(p) for p in SAVED["pos"]]
+    pos[3] = [float("nan"), 0.0]
+    fname = write(tmp_path / "nan.json", dict(SAVED, pos=pos))
+    found = validate([fname], jobs=1)["files_with_problems"]
+    assert found == {fname: ["non finite positions"]}
+
+
+def test_reports_torn_log_line(tmp_path):
+    log = tmp_path / "lm.txt"
+    log.write_text(log_line("a.jpg", SAVED["pos"]) + '"b.jpg" : [[1.0, 2\n' +
+                   log_line("a.jpg", SAVED["pos"]))
+    report = validate([str(log)], jobs=1)
+    assert report["files"] == 3
+    assert report["files_with_problems"] == {
+        f"{log}:2": [f"unreadable: {log}:2"]}
+
+
+def test_repeated_log_is_not_a_duplicate(tmp_path):
+    log = tmp_path / "lm.txt"
+    log.write_text(log_line("no_image", SAVED["pos"]) * 2)
+    report = validate([str(log), str(log)], jobs=1)
+    assert report["files"] == 4
+    assert report["files_with_problems"] == {}